@@ -0,0 +1,251 @@
+# pyright: strict
+"""Big5-HKSCS codec with the HKSCS-2016 mappings, registered as "big5hkscs2016".
+
+Pairs are decoded like the big5hkscs codec in Python does, but with the HKSCS
+characters of hk_data/HKSCS2016.json (loaded by mapstuff.py, as when generating
+mappings_hk.h) instead of the HKSCS-2004 ones compiled into Python:
+
+- the Big5 mappings of the big5 codec, except for C6A1-C8FE;
+- then the HKSCS characters, including those outside the BMP;
+- then the four pairs that decode to two characters (0x8862, 0x8864, 0x88A3, 0x88A5).
+
+Errors are reported like big5hkscs does: a byte that doesn't start a valid pair is
+an error of one byte, and the next one is decoded again.
+
+Decoding is done by big5hkscs (in C), with the few differences patched: the pairs
+added after HKSCS-2004 are errors for big5hkscs, which are decoded in the error
+handler, and the three pairs mapped to other characters since then are translated
+afterwards. Encoding uses the same engine as big5web (big5web.engine), with the
+tables above, which can also decode (without big5hkscs).
+
+  import big5hkscs2016  # need to import before the codec is available
+  text = data.decode("big5hkscs2016")
+"""
+import codecs
+import functools
+from pathlib import Path
+import re
+
+from big5web import engine
+from big5web.engine import DecodeTable, TableCodec, pair_key
+from mapstuff import bh2s, load_ccli_json, load_hkscs_map
+
+ENCODING = "big5hkscs2016"
+
+HKSCS_JSON_PATH = Path(__file__).parent / "hk_data" / "HKSCS2016.json"
+
+LEAD_BYTES = range(0x81, 0xFF)
+TRAIL_BYTES = range(0x40, 0xFF)
+
+COMPOSED_TABLE = {
+    b"\x88\x62": "\u00CA\u0304",  # Ê̄ (CAPITAL LETTER E WITH CIRCUMFLEX AND MACRON)
+    b"\x88\x64": "\u00CA\u030C",  # Ê̌ (CAPITAL LETTER E WITH CIRCUMFLEX AND CARON)
+    b"\x88\xa3": "\u00EA\u0304",  # ê̄ (SMALL LETTER E WITH CIRCUMFLEX AND MACRON)
+    b"\x88\xa5": "\u00EA\u030C",  # ê̌ (SMALL LETTER E WITH CIRCUMFLEX AND CARON)
+}
+
+
+def load_hkscs_table(path: Path = HKSCS_JSON_PATH) -> "dict[bytes, str]":
+    """Character for each HKSCS pair in path (a copy of HKSCS2016.json)."""
+    decmap, _, _, isbmpmap = load_hkscs_map(load_ccli_json(path))
+    table: dict[bytes, str] = {}
+    for lead, trails in decmap.items():
+        for trail, scalar in trails.items():
+            # Like big5hkscs, which only keeps a bit for each pair in the hints of
+            # mappings_hk.h: all the characters outside the BMP are in plane 2.
+            if isbmpmap.get(bh2s(lead << 8 | trail)):
+                scalar |= 0x20000
+            table[bytes((lead, trail))] = chr(scalar)
+    return table
+
+
+def _big5_mapped(lead: int, trail: int) -> bool:
+    # big5hkscs doesn't use the big5 mappings for C6A1-C8FE, which HKSCS redefines
+    return not (0xC6 <= lead <= 0xC8 and (lead > 0xC6 or trail >= 0xA1))
+
+
+@functools.cache
+def _decode_table() -> DecodeTable:
+    hkscs = load_hkscs_table()
+    table = DecodeTable.empty()
+    for lead in LEAD_BYTES:
+        for trail in TRAIL_BYTES:
+            pair = bytes((lead, trail))
+            result = None
+            if _big5_mapped(lead, trail):
+                try:
+                    result = pair.decode("big5")
+                except UnicodeDecodeError:
+                    pass
+            if result is None:
+                result = hkscs.get(pair)
+            if result is not None:
+                table.code_points[pair_key(lead, trail)] = ord(result)
+    for pair, text in COMPOSED_TABLE.items():
+        table.composed[pair_key(*pair)] = text
+    return table
+
+
+# Either a run of ASCII bytes, or a run of pairs which might be mapped. Anything else
+# is handled one byte at a time by the slow path.
+_RUN = re.compile(rb"([\x00-\x7f]+)|((?:[\x81-\xfe][\x40-\xfe])+)")
+
+
+@functools.cache
+def _overrides() -> "tuple[dict[bytes, str], dict[int, str]]":
+    # The text of the pairs that big5hkscs can't decode; and for the pairs remapped
+    # since HKSCS-2004, the new text of the character that big5hkscs decodes them to
+    # (which it decodes from no other pair).
+    table = _decode_table()
+    added: dict[bytes, str] = {}
+    remapped: dict[int, str] = {}
+    old_texts: list[str] = []
+    for lead in LEAD_BYTES:
+        for trail in TRAIL_BYTES:
+            pair = bytes((lead, trail))
+            text = table.text(lead, trail)
+            try:
+                old_text = pair.decode("big5hkscs")
+            except UnicodeDecodeError:
+                if text is not None:
+                    added[pair] = text
+                continue
+            old_texts.append(old_text)
+            if text is None:
+                raise ValueError(f"{pair.hex().upper()} would be decoded")
+            if old_text != text:
+                remapped[ord(old_text)] = text
+    if any(old_texts.count(chr(cp)) > 1 for cp in remapped):
+        raise ValueError("a remapped character is decoded from another pair")
+    return added, remapped
+
+
+@functools.cache
+def _error_handler(errors: str) -> str:
+    # Name of the error handler passed to big5hkscs instead of errors. The errors
+    # handler is looked up for each error, like a codec would do.
+    added, _ = _overrides()
+
+    def handle(exc: UnicodeError):
+        if isinstance(exc, UnicodeDecodeError):
+            text = added.get(exc.object[exc.start : exc.start + 2])
+            if text is not None:
+                return (text, exc.start + 2)
+            exc = UnicodeDecodeError(
+                ENCODING, exc.object, exc.start, exc.end, exc.reason
+            )
+        return codecs.lookup_error(errors)(exc)
+
+    name = f"{ENCODING}-{errors}"
+    codecs.register_error(name, handle)
+    return name
+
+
+_big5hkscs_decode = codecs.lookup("big5hkscs").decode
+_Big5hkscsDecoder = codecs.getincrementaldecoder("big5hkscs")
+
+
+def _slow_path(data: memoryview, pos: int, final: bool):
+    if pos + 1 == len(data):
+        if not final:
+            return None
+        return (pos, "incomplete multibyte sequence", 0)
+    return (pos, "illegal multibyte sequence", 0)
+
+
+@functools.cache
+def _encode_tables() -> "tuple[dict[int, bytes], re.Pattern[str], re.Pattern[str]]":
+    # Like big5hkscs, the HKSCS pairs come first, then the ones from big5.
+    encoding_map = {cp: bytes((cp,)) for cp in range(0x80)}
+    for pair, char in load_hkscs_table().items():
+        encoding_map.setdefault(ord(char), pair)
+    for cp in _decode_table().code_points:
+        if cp != 0 and cp not in encoding_map:
+            encoding_map[cp] = chr(cp).encode("big5")
+    encodable = "".join(map(re.escape, map(chr, sorted(encoding_map))))
+    encodable_run = re.compile(f"[{encodable}]*")
+    # Like big5hkscs, errors are reported one character at a time
+    unencodable = re.compile(f"[^{encodable}]")
+    return encoding_map, encodable_run, unencodable
+
+
+_CODEC = TableCodec(
+    ENCODING,
+    _decode_table,
+    _RUN,
+    _slow_path,
+    _encode_tables,
+    {text: pair for pair, text in COMPOSED_TABLE.items()},
+)
+
+
+def decode(input: bytes, errors: str = "strict", final: bool = True):
+    """Decode input, returning the decoded text and the number of bytes consumed.
+
+    If final is false, a lead byte at the end of input is not an error: it's left out
+    of the consumed bytes, so that it can be decoded together with more input.
+    """
+    _, remapped = _overrides()
+    handler = _error_handler(errors)
+    if final:
+        text, consumed = _big5hkscs_decode(input, handler)
+    else:
+        decoder = _Big5hkscsDecoder(handler)
+        text = decoder.decode(input)
+        consumed = len(input) - len(decoder.getstate()[0])
+    # (characters from the error handler are translated too, but no standard
+    # handler returns those)
+    if any(chr(cp) in text for cp in remapped):
+        text = text.translate(remapped)
+    return (text, consumed)
+
+
+def encode(input: str, errors: str = "strict"):
+    return _CODEC.encode(input, errors)
+
+
+class _CodecFunctions:
+    # decode() and encode() are looked up when called, like in big5web
+    def decode_input(self, input: bytes, errors: str, final: bool):
+        return decode(input, errors, final)
+
+    def encode_input(self, input: str, errors: str):
+        return encode(input, errors)
+
+
+class IncrementalEncoder(_CodecFunctions, engine.IncrementalEncoder):
+    # Ê and ê, which might be followed by a combining character
+    pending_chars = "\u00CA\u00EA"
+
+
+class IncrementalDecoder(_CodecFunctions, engine.IncrementalDecoder):
+    pass
+
+
+class StreamWriter(_CodecFunctions, engine.StreamWriter):
+    pass
+
+
+class StreamReader(_CodecFunctions, engine.StreamReader):
+    pass
+
+
+def getregentry():
+    return codecs.CodecInfo(
+        name=ENCODING,
+        encode=encode,
+        decode=decode,
+        incrementalencoder=IncrementalEncoder,
+        incrementaldecoder=IncrementalDecoder,
+        streamreader=StreamReader,
+        streamwriter=StreamWriter,
+    )
+
+
+def search_function(name: str):
+    # Also found as big5-hkscs-2016 and so on
+    if name.replace("-", "").replace("_", "") == ENCODING:
+        return getregentry()
+
+
+codecs.register(search_function)
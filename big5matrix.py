@@ -0,0 +1,247 @@
+"""Compare how Big5 codecs decode the whole 2-byte space.
+
+Every lead byte 0x81-0xFE is combined with every trail byte 0x40-0xFE, and each pair
+is decoded with big5web, the Big5 codecs in Python, and the HKSCS-2016 table from
+hk_data/HKSCS2016.json. The results are cached as one array of code points per codec,
+so that queries don't need to decode anything.
+"""
+import argparse
+from array import array
+from dataclasses import dataclass
+import hashlib
+import json
+import os
+from pathlib import Path
+import sys
+from typing import Iterator, Optional
+
+import big5web
+from mapstuff import load_ccli_json
+
+LEADS = range(0x81, 0xFF)
+TRAILS = range(0x40, 0xFF)
+PAIR_COUNT = len(LEADS) * len(TRAILS)
+
+CODECS = ["big5web", "big5", "cp950", "big5hkscs", "hkscs2016"]
+
+HKSCS_JSON_PATH = Path(__file__).parent / "hk_data" / "HKSCS2016.json"
+CACHE_PATH = Path(__file__).with_suffix(".cache")
+CACHE_VERSION = 1
+
+# Code point used in the arrays when a pair doesn't decode to a single character. The
+# actual text is then stored separately (see Matrix.texts).
+MULTIPLE = 0xFFFFFFFF
+
+
+def pair_index(lead: int, trail: int) -> int:
+    return (lead - LEADS.start) * len(TRAILS) + (trail - TRAILS.start)
+
+
+def index_pair(index: int) -> bytes:
+    lead, trail = divmod(index, len(TRAILS))
+    return bytes((lead + LEADS.start, trail + TRAILS.start))
+
+
+def load_hkscs2016_table() -> "dict[bytes, str]":
+    return {
+        big5.to_bytes(2, "big"): chr(cp)
+        for cp, big5 in load_ccli_json(HKSCS_JSON_PATH).items()
+    }
+
+
+@dataclass
+class Matrix:
+    # Code point for each pair by codec: 0 if the pair is not valid, MULTIPLE if it
+    # decodes to more than one character.
+    code_points: "dict[str, array]"
+    # Decoded text for the pairs that are MULTIPLE, by codec and pair index
+    texts: "dict[str, dict[int, str]]"
+
+    def decoded(self, codec: str, index: int) -> Optional[str]:
+        cp = self.code_points[codec][index]
+        if cp == 0:
+            return None
+        elif cp == MULTIPLE:
+            return self.texts[codec][index]
+        return chr(cp)
+
+    def differences(self, codec_a: str, codec_b: str) -> Iterator[int]:
+        """Indexes of the pairs which decode differently with the two codecs."""
+        a = self.code_points[codec_a]
+        b = self.code_points[codec_b]
+        for index, (cp_a, cp_b) in enumerate(zip(a, b)):
+            if cp_a != cp_b or (
+                cp_a == MULTIPLE
+                and self.texts[codec_a][index] != self.texts[codec_b][index]
+            ):
+                yield index
+
+
+def sweep(codec: str) -> "tuple[array, dict[int, str]]":
+    code_points = array("I", [0]) * PAIR_COUNT
+    texts: dict[int, str] = {}
+    hkscs_table = load_hkscs2016_table() if codec == "hkscs2016" else {}
+    for index in range(PAIR_COUNT):
+        pair = index_pair(index)
+        if codec == "hkscs2016":
+            text = hkscs_table.get(pair)
+        else:
+            try:
+                text = pair.decode(codec)
+            except UnicodeDecodeError:
+                text = None
+        if text is None:
+            continue
+        elif len(text) == 1:
+            code_points[index] = ord(text)
+        else:
+            code_points[index] = MULTIPLE
+            texts[index] = text
+    return code_points, texts
+
+
+def _cache_key() -> str:
+    # Python's own codecs can change between versions, as can the data files
+    key = hashlib.sha256()
+    key.update(f"{CACHE_VERSION} {sys.version}\n".encode())
+    key.update(f"{' '.join(CODECS)}\n".encode())
+    key.update(big5web.read_index_identifier().encode())
+    key.update(HKSCS_JSON_PATH.read_bytes())
+    return key.hexdigest()
+
+
+def build_matrix() -> Matrix:
+    matrix = Matrix({}, {})
+    for codec in CODECS:
+        matrix.code_points[codec], matrix.texts[codec] = sweep(codec)
+    return matrix
+
+
+def load_matrix(cache_path: Path = CACHE_PATH, rebuild: bool = False) -> Matrix:
+    """Load the matrix from the cache, or build it (and update the cache).
+
+    The cache starts with a line of JSON with the cache key, the codecs, and the texts
+    of pairs decoding to multiple characters; then the arrays follow, in the order of
+    the codecs, as little endian 32-bit integers.
+    """
+    key = _cache_key()
+    if not rebuild:
+        try:
+            with open(cache_path, "rb") as f:
+                header = json.loads(f.readline())
+                if header["key"] == key:
+                    matrix = Matrix({}, {})
+                    for codec in header["codecs"]:
+                        code_points = array("I")
+                        code_points.fromfile(f, PAIR_COUNT)
+                        if sys.byteorder != "little":
+                            code_points.byteswap()
+                        matrix.code_points[codec] = code_points
+                        texts = header["texts"][codec]
+                        matrix.texts[codec] = {int(i): t for i, t in texts.items()}
+                    return matrix
+        except (OSError, ValueError, KeyError, EOFError):
+            pass
+
+    matrix = build_matrix()
+    header = {"key": key, "codecs": [*matrix.code_points], "texts": matrix.texts}
+    # Written next to it first, so that an interrupted run never leaves half a cache
+    temp_path = cache_path.with_suffix(f".{os.getpid()}.tmp")
+    try:
+        with open(temp_path, "wb") as f:
+            f.write(json.dumps(header).encode("ascii") + b"\n")
+            for code_points in matrix.code_points.values():
+                if sys.byteorder != "little":
+                    code_points = array("I", code_points)
+                    code_points.byteswap()
+                code_points.tofile(f)
+        os.replace(temp_path, cache_path)
+    except OSError as err:
+        temp_path.unlink(missing_ok=True)
+        print(f"Warning: can't write cache: {err}", file=sys.stderr)
+    return matrix
+
+
+### Command line utility ###
+
+
+def format_decoded(text: Optional[str]) -> str:
+    if text is None:
+        return "-"
+    return " ".join(f"U+{ord(c):04X}" for c in text) + f" {text}"
+
+
+def print_stats(matrix: Matrix):
+    print("Mapped pairs by codec:")
+    for codec, code_points in matrix.code_points.items():
+        print(f"  {codec:<10} {PAIR_COUNT - code_points.count(0):>6}")
+    print()
+    print("Differences (differ / only first / only second):")
+    codecs = [*matrix.code_points]
+    for i, codec_a in enumerate(codecs):
+        for codec_b in codecs[i + 1 :]:
+            a = matrix.code_points[codec_a]
+            b = matrix.code_points[codec_b]
+            only_a = only_b = differ = 0
+            for index in matrix.differences(codec_a, codec_b):
+                if b[index] == 0:
+                    only_a += 1
+                elif a[index] == 0:
+                    only_b += 1
+                else:
+                    differ += 1
+            print(f"  {codec_a:<10} {codec_b:<10} {differ:>6} {only_a:>6} {only_b:>6}")
+
+
+def print_diff(matrix: Matrix, codec_a: str, codec_b: str, limit: Optional[int]):
+    for count, index in enumerate(matrix.differences(codec_a, codec_b)):
+        if limit is not None and count >= limit:
+            break
+        decoded_a = format_decoded(matrix.decoded(codec_a, index))
+        decoded_b = format_decoded(matrix.decoded(codec_b, index))
+        print(f"{index_pair(index).hex().upper()}  {decoded_a:<20} {decoded_b}")
+
+
+@dataclass
+class MatrixCLIArguments:
+    command: str
+    codecs: "list[str]"
+    limit: Optional[int]
+    cache: str
+    rebuild: bool
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description=f"""
+Compare how Big5 codecs decode each pair in the 2-byte space (lead 0x81-0xFE, trail
+0x40-0xFE). Codecs: {", ".join(CODECS)}.
+
+  stats              print the number of mapped pairs, and of differences
+  diff CODEC CODEC   print the pairs which decode differently, like:
+
+                       A145  U+2022 •             U+2027 ‧
+""",
+        formatter_class=argparse.RawTextHelpFormatter,
+    )
+    parser.add_argument("command", choices=["stats", "diff"])
+    parser.add_argument("codecs", nargs="*", metavar="codec")
+    parser.add_argument("-n", "--limit", type=int, help="maximum number of pairs")
+    parser.add_argument(
+        "--cache",
+        default=str(CACHE_PATH),
+        help="path of the cache file (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--rebuild", action="store_true", help="rebuild the cache even if up to date"
+    )
+    args = parser.parse_args(namespace=MatrixCLIArguments)
+    if args.command == "diff" and (
+        len(args.codecs) != 2 or not set(args.codecs) <= set(CODECS)
+    ):
+        parser.error(f"diff needs two codecs among: {', '.join(CODECS)}")
+    matrix = load_matrix(Path(args.cache), args.rebuild)
+    if args.command == "stats":
+        print_stats(matrix)
+    else:
+        print_diff(matrix, args.codecs[0], args.codecs[1], args.limit)
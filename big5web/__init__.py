@@ -1,7 +1,16 @@
 # pyright: strict
+from array import array
 import codecs
-from io import StringIO
+import functools
+import itertools
+import os
 from pathlib import Path
+import re
+import sys
+from typing import Iterable, Iterator, Mapping
+
+from . import engine
+from .engine import DecodeTable, SourceOffsets, TableCodec, pair_key
 
 ENCODING = "big5web"
 
@@ -13,11 +22,23 @@ DOUBLE_CHAR_TABLE = {
 }
 
 
+LEAD_BYTES = range(0x81, 0xFF)
+TRAIL_BYTES = [*range(0x40, 0x7F), *range(0xA1, 0xFF)]
+POINTER_COUNT = len(LEAD_BYTES) * len(TRAIL_BYTES)
+
+INDEX_PATH = Path(__file__).parent / "index-big5.txt"
+COMPILED_INDEX_PATH = INDEX_PATH.with_suffix(".bin")
+
+
+def pointer_for(lead: int, trail: int) -> int:
+    offset = 0x40 if trail < 0x7F else 0x62
+    return (lead - 0x81) * 157 + (trail - offset)
+
+
 def load_big5_index() -> dict[int, str]:
     # https://encoding.spec.whatwg.org/index-big5.txt
     index: dict[int, str] = {}
-    index_path = Path(__file__).parent / "index-big5.txt"
-    with open(index_path, "rt") as f:
+    with open(INDEX_PATH, "rt") as f:
         for line in f:
             parts = line.split("\t")
             if len(parts) >= 2:
@@ -28,100 +49,396 @@ def load_big5_index() -> dict[int, str]:
     return index
 
 
-BIG5_INDEX = load_big5_index()
+def read_index_identifier() -> str:
+    # The header of the index includes a line like:
+    # # Identifier: 8dfc771062e7be0810919082c2c06baa2236147909e0ecc235b1cb9ad782ac82
+    with open(INDEX_PATH, "rt") as f:
+        for line in f:
+            if not line.startswith("#"):
+                break
+            key, _, value = line[1:].partition(":")
+            if key.strip() == "Identifier":
+                return value.strip()
+    raise ValueError(f"no identifier found in {INDEX_PATH}")
 
 
-def decode(input: bytes, errors: str = "strict"):
-    # print("big5web decode", bytes(input), errors)
-    error_handler = codecs.lookup_error(errors)
-    outfile = StringIO()
-    write = outfile.write
-    pos = 0
-    length = len(input)
+def compile_big5_index(index: dict[int, str]) -> array:
+    # Code point for each pointer, with 0 for unmapped pointers. The extra item at
+    # POINTER_COUNT is never mapped.
+    code_points = array("I", [0]) * (POINTER_COUNT + 1)
+    for pointer, char in index.items():
+        code_points[pointer] = ord(char)
+    return code_points
 
-    def getbyte():
-        nonlocal pos
-        if pos < length:
-            b = input[pos]
-            # print("consumed:", hex(b), chr(b), pos)
-            pos = pos + 1
-            return b
-        else:
+
+def load_compiled_big5_index() -> array:
+    """Load the index as compiled by compile_big5_index().
+
+    The compiled index is cached in COMPILED_INDEX_PATH, with a header that ties it to
+    the identifier of index-big5.txt. If the cache is missing or stale, the index is
+    compiled again and the cache is replaced (if the directory is writable).
+    """
+    header = f"big5web {read_index_identifier()}\n".encode("ascii")
+    code_points = array("I")
+    try:
+        data = COMPILED_INDEX_PATH.read_bytes()
+    except OSError:
+        data = b""
+    if (
+        data.startswith(header)
+        and len(data) == len(header) + (POINTER_COUNT + 1) * code_points.itemsize
+    ):
+        code_points.frombytes(data[len(header) :])
+        if sys.byteorder != "little":
+            code_points.byteswap()
+        return code_points
+
+    code_points = compile_big5_index(load_big5_index())
+    little_endian = array("I", code_points)
+    if sys.byteorder != "little":
+        little_endian.byteswap()
+    temp_path = COMPILED_INDEX_PATH.with_suffix(f".{os.getpid()}.tmp")
+    try:
+        with open(temp_path, "wb") as f:
+            f.write(header)
+            little_endian.tofile(f)
+        os.replace(temp_path, COMPILED_INDEX_PATH)
+    except OSError:
+        temp_path.unlink(missing_ok=True)
+    return code_points
+
+
+@functools.cache
+def _code_points() -> array:
+    code_points = load_compiled_big5_index()
+    assert code_points.itemsize == 4
+    return code_points
+
+
+class Big5Index(Mapping[int, str]):
+    """Read-only mapping from pointer to character, like the one that would be built
+    by load_big5_index(), backed by the compiled index.
+    """
+
+    def __init__(self, code_points: array):
+        self._code_points = code_points
+
+    @property
+    def code_points(self) -> memoryview:
+        """Read-only view of the code point for each pointer, 0 if unmapped."""
+        return memoryview(self._code_points).toreadonly()[:POINTER_COUNT]
+
+    def __getitem__(self, pointer: int) -> str:
+        if isinstance(pointer, int) and 0 <= pointer < POINTER_COUNT:
+            cp = self._code_points[pointer]
+            if cp != 0:
+                return chr(cp)
+        raise KeyError(pointer)
+
+    def __contains__(self, pointer: object) -> bool:
+        if isinstance(pointer, int) and 0 <= pointer < POINTER_COUNT:
+            return self._code_points[pointer] != 0
+        return False
+
+    def __iter__(self) -> Iterator[int]:
+        return itertools.compress(range(POINTER_COUNT), self._code_points)
+
+    def __len__(self) -> int:
+        return POINTER_COUNT - self._code_points[:POINTER_COUNT].count(0)
+
+
+def __getattr__(name: str):
+    # BIG5_INDEX is only loaded on first access.
+    if name == "BIG5_INDEX":
+        index = Big5Index(_code_points())
+        globals()["BIG5_INDEX"] = index
+        return index
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+@functools.cache
+def _decode_table() -> DecodeTable:
+    # The code points of the index, by pair instead of pointer
+    code_points = _code_points()
+    table = DecodeTable.empty()
+    for lead in LEAD_BYTES:
+        for trail in TRAIL_BYTES:
+            table.code_points[pair_key(lead, trail)] = code_points[
+                pointer_for(lead, trail)
+            ]
+    for pointer, text in DOUBLE_CHAR_TABLE.items():
+        table.composed[pair_key(*bytes_for(pointer))] = text
+    return table
+
+
+# Either a run of ASCII bytes, or a run of well-formed lead/trail pairs. Anything
+# else (including pairs with a pointer that is not in the index) is handled one
+# byte at a time by the slow path.
+_RUN = re.compile(rb"([\x00-\x7f]+)|((?:[\x81-\xfe][\x40-\x7e\xa1-\xfe])+)")
+
+
+def _slow_path(data: memoryview, pos: int, final: bool):
+    lead = data[pos]
+    if not 0x81 <= lead <= 0xFE:
+        return (pos, "invalid start byte", 0)
+    elif pos + 1 == len(data):
+        if not final:
             return None
+        return (pos, "incomplete multibyte sequence", 0)
+    # Either byte is not in the range 0x40 to 0x7E, inclusive, or 0xA1 to 0xFE,
+    # inclusive, or the pointer is not in the index.
+    # > If byte is an ASCII byte, prepend byte to ioQueue.
+    # This means to "unread" the byte.
+    return (pos + 1, "illegal multibyte sequence", 1 if data[pos + 1] < 0x80 else 0)
 
-    def error(reason: str = ""):
-        nonlocal pos
-        exc = UnicodeDecodeError(ENCODING, input, pos - 1, pos, reason)
-        # print(exc)
-        replacement, newpos = error_handler(exc)
-        if isinstance(replacement, bytes):
-            replacement = replacement.decode("ascii")
-        # print(f"replacing input[{pos}] with {replacement!r}")
-        # print(f"skipping to {newpos}")
-        write(replacement)
-        pos = newpos
-
-    # breakpoint()
-    big5_lead = 0x00
-    while True:
-        b = getbyte()
-        if b is None:
-            if big5_lead != 0x00:
-                big5_lead = 0x00
-                error("incomplete multibyte sequence")
-            else:
-                # finished
-                break
+
+def decode(
+    input: bytes,
+    errors: str = "strict",
+    final: bool = True,
+    *,
+    start: int = 0,
+    end: "int | None" = None,
+):
+    """Decode input, returning the decoded text and the number of bytes consumed.
+
+    If final is false, a lead byte at the end of input is not an error: it's left out
+    of the consumed bytes, so that it can be decoded together with more input.
+
+    input can be any object supporting the buffer protocol (like bytearray,
+    memoryview or mmap), and it's never copied. If start or end are given, only
+    input[start:end] is decoded, and positions (including the number of bytes
+    consumed, and those in errors) are relative to start.
+    """
+    return _CODEC.decode(input, errors, final, start=start, end=end)
+
+
+def decode_with_offsets(
+    input: bytes,
+    errors: str = "strict",
+    *,
+    start: int = 0,
+    end: "int | None" = None,
+) -> "tuple[str, SourceOffsets]":
+    """Decode input like decode(), also returning the position of each character.
+
+    offsets[i] is the position in input (relative to start) of the byte sequence that
+    was decoded to text[i]. Characters from an error handler have the position of the
+    byte in error.
+    """
+    with memoryview(input) as view, view.cast("B") as octets, octets[start:end] as data:
+        if isinstance(input, bytes) and len(data) == len(input):
+            error_object = input
         else:
-            if big5_lead != 0x00:
-                lead = big5_lead
-                pointer = None
-                big5_lead = 0x00
-                offset = 0x40 if b < 0x7F else 0x62
-                # If byte is in the range 0x40 to 0x7E, inclusive, or 0xA1 to 0xFE,
-                # inclusive, set pointer to (lead − 0x81) × 157 + (byte − offset).
-                if (0x40 <= b <= 0x7E) or (0xA1 <= b <= 0xFE):
-                    pointer = (lead - 0x81) * 157 + (b - offset)
-                try:
-                    result = DOUBLE_CHAR_TABLE[pointer]  # type: ignore
-                except KeyError:
-                    pass
-                else:
-                    write(result)
-                    del result
-                    continue
-                if pointer is not None:
-                    code_point = BIG5_INDEX.get(pointer)
-                else:
-                    code_point = None
-                if code_point:
-                    write(code_point)
-                    del code_point
-                    continue
-                error("illegal multibyte sequence")
-                if b < 0x80:
-                    # > If byte is an ASCII byte, prepend byte to ioQueue.
-                    # This means to "unread" the byte:
-                    pos -= 1
-            elif b < 0x80:
-                # If byte is an ASCII byte, return a code point whose value is byte.
-                write(chr(b))
-            elif 0x81 <= b <= 0xFE:
-                big5_lead = b
+            error_object = data
+        offsets = SourceOffsets()
+        text, _ = _CODEC.decode_view(data, error_object, errors, True, offsets)
+        return text, offsets
+
+
+def _byte_class(values: "list[int]") -> bytes:
+    # Regular expression character class for a sorted list of byte values
+    ranges: list[bytes] = []
+    runs = itertools.groupby(enumerate(values), lambda item: item[1] - item[0])
+    for _, group in runs:
+        first, *rest = (bytes((value,)) for _, value in group)
+        last = rest[-1] if rest else first
+        ranges.append(re.escape(first) + b"-" + re.escape(last))
+    return b"[" + b"".join(ranges) + b"]"
+
+
+@functools.cache
+def _valid_prefix() -> "re.Pattern[bytes]":
+    # Matches the longest prefix that decodes without errors. Lead bytes sharing the
+    # same set of valid trail bytes are grouped together, so there are only a few
+    # alternatives.
+    table = _decode_table()
+    trails_for_leads: dict[tuple[int, ...], list[int]] = {}
+    for lead in LEAD_BYTES:
+        trails = tuple(
+            trail
+            for trail in TRAIL_BYTES
+            if table.text(lead, trail) is not None
+        )
+        if trails:
+            trails_for_leads.setdefault(trails, []).append(lead)
+    pairs = [
+        _byte_class(leads) + _byte_class([*trails])
+        for trails, leads in trails_for_leads.items()
+    ]
+    return re.compile(rb"(?:[\x00-\x7f]+|" + b"|".join(pairs) + rb")*")
+
+
+def find_errors(
+    input: bytes,
+    limit: "int | None" = None,
+    *,
+    start: int = 0,
+    end: "int | None" = None,
+) -> "list[tuple[int, str]]":
+    """Find the decoding errors in input, without decoding it.
+
+    Returns the position and reason of each error, as they would be reported to an
+    error handler by decode() (with a handler that skips the bad byte, like
+    "replace"). At most limit errors are returned. input, start and end are as in
+    decode().
+    """
+    errors: list[tuple[int, str]] = []
+    with memoryview(input) as view, view.cast("B") as octets, octets[start:end] as data:
+        length = len(data)
+        match_valid = _valid_prefix().match
+        pos = 0
+        while limit is None or len(errors) < limit:
+            pos = match_valid(data, pos).end()  # type: ignore
+            if pos == length:
+                break
+            lead = data[pos]
+            if not 0x81 <= lead <= 0xFE:
+                errors.append((pos, "invalid start byte"))
+                pos += 1
+            elif pos + 1 == length:
+                errors.append((pos, "incomplete multibyte sequence"))
+                break
             else:
-                error("invalid start byte")
-    return (outfile.getvalue(), pos)
+                errors.append((pos + 1, "illegal multibyte sequence"))
+                # An ASCII trail byte is read again (see _slow_path())
+                pos += 1 if data[pos + 1] < 0x80 else 2
+    return errors
+
+
+def validate(input: bytes, *, start: int = 0, end: "int | None" = None) -> bool:
+    """Check whether input can be decoded without errors, without decoding it."""
+    return not find_errors(input, 1, start=start, end=end)
+
+
+def _decode_record(input: bytes, errors: str) -> str:
+    if isinstance(input, bytes):
+        # Skip the setup of decode(), which matters for small inputs
+        if input.isascii():
+            return str(input, "ascii")
+        return _CODEC.decode_view(memoryview(input), input, errors, True)[0]
+    return decode(input, errors)[0]
+
+
+def _decode_batch(
+    inputs: "list[bytes]", errors: str, separator: "bytes | None"
+) -> "list[str]":
+    if separator is None or not inputs:
+        return [_decode_record(input, errors) for input in inputs]
+    joined = separator.join(inputs)
+    if joined.count(separator) != len(inputs) - 1:
+        raise ValueError(f"separator {separator!r} found in an input")
+    # The separator is never a trail byte, so each input is decoded as if on its
+    # own, except for the errors: those inputs are decoded again with errors.
+    text, _ = decode(joined, "replace")
+    texts = text.split(separator.decode("ascii"))
+    if "\ufffd" in text:
+        for i, input in enumerate(inputs):
+            if "\ufffd" in texts[i]:
+                texts[i] = _decode_record(input, errors)
+    return texts
+
+
+def decode_many(
+    inputs: "Iterable[bytes]",
+    errors: str = "strict",
+    *,
+    separator: "bytes | None" = None,
+    workers: "int | None" = None,
+    batch_size: int = 10000,
+) -> "list[str]":
+    """Decode each of inputs, like decode() but faster for many small inputs.
+
+    If separator is given, it must be a byte below 0x40 which is not in any input:
+    then the inputs are joined with it and decoded at once, which is faster if most
+    of them are not ASCII.
+
+    If workers is given, batches of batch_size inputs are decoded by a pool of that
+    many processes. The inputs must be picklable, and errors the name of an error
+    handler which is registered in the workers too.
+    """
+    codecs.lookup_error(errors)
+    if separator is not None and (len(separator) != 1 or separator[0] >= 0x40):
+        raise ValueError("separator must be a single byte below 0x40")
+    inputs = list(inputs)
+    if workers is None:
+        return _decode_batch(inputs, errors, separator)
+
+    from concurrent.futures import ProcessPoolExecutor
+
+    batches = [inputs[i : i + batch_size] for i in range(0, len(inputs), batch_size)]
+    with ProcessPoolExecutor(workers) as executor:
+        results = executor.map(
+            _decode_batch,
+            batches,
+            itertools.repeat(errors),
+            itertools.repeat(separator),
+        )
+        return [text for batch in results for text in batch]
+
+
+# Pointers below this are HKSCS extensions, which are only decoded.
+ENCODE_POINTER_MIN = (0xA1 - 0x81) * 157
+
+# For these code points the encoder uses the last pointer in the index instead of
+# the first one.
+LAST_POINTER_CODE_POINTS = frozenset([0x2550, 0x255E, 0x2561, 0x256A, 0x5341, 0x5345])
+
+
+def bytes_for(pointer: int) -> bytes:
+    lead, trail = divmod(pointer, 157)
+    offset = 0x40 if trail < 0x3F else 0x62
+    return bytes((lead + 0x81, trail + offset))
+
+
+@functools.cache
+def _encode_tables() -> "tuple[dict[int, bytes], re.Pattern[str], re.Pattern[str]]":
+    code_points = _code_points()
+    encoding_map = {cp: bytes((cp,)) for cp in range(0x80)}
+    for pointer in range(ENCODE_POINTER_MIN, POINTER_COUNT):
+        cp = code_points[pointer]
+        if cp == 0:
+            continue
+        if cp not in encoding_map or cp in LAST_POINTER_CODE_POINTS:
+            encoding_map[cp] = bytes_for(pointer)
+    encodable = "".join(map(re.escape, map(chr, sorted(encoding_map))))
+    # Only ever used with match(), which is much faster than searching for a
+    # negated character set.
+    encodable_run = re.compile(f"[{encodable}]*")
+    unencodable_run = re.compile(f"[^{encodable}]+")
+    return encoding_map, encodable_run, unencodable_run
+
+
+_CODEC = TableCodec(ENCODING, _decode_table, _RUN, _slow_path, _encode_tables)
 
 
 def encode(input: str, errors: str = "strict"):
-    assert False
+    return _CODEC.encode(input, errors)
+
+
+class _CodecFunctions:
+    # decode() and encode() are looked up when called, so that they can be replaced
+    def decode_input(self, input: bytes, errors: str, final: bool):
+        return decode(input, errors, final)
+
+    def encode_input(self, input: str, errors: str):
+        return encode(input, errors)
+
+
+class IncrementalEncoder(_CodecFunctions, engine.IncrementalEncoder):
+    pass
+
+
+class IncrementalDecoder(_CodecFunctions, engine.IncrementalDecoder):
+    pass
+
+
+class StreamWriter(_CodecFunctions, engine.StreamWriter):
+    pass
 
 
-# XXX: BufferedIncrementalDecoder is undocumented, but it's convenient, so is it ok to
-# use here?
-class IncrementalDecoder(codecs.BufferedIncrementalDecoder):
-    def _buffer_decode(self, input: bytes, errors: str, final: bool):
-        return decode(input, errors)
+class StreamReader(_CodecFunctions, engine.StreamReader):
+    pass
 
 
 def getregentry():
@@ -129,7 +446,10 @@ def getregentry():
         name=ENCODING,
         encode=encode,
         decode=decode,
+        incrementalencoder=IncrementalEncoder,
         incrementaldecoder=IncrementalDecoder,
+        streamreader=StreamReader,
+        streamwriter=StreamWriter,
     )
 
 
@@ -0,0 +1,173 @@
+# pyright: strict
+"""Transcode big5web to UTF-8:
+
+  python -m big5web archive.txt -o archive.utf8.txt --errors replace
+  cat archive.txt | python -m big5web > archive.utf8.txt
+"""
+import argparse
+import codecs
+from dataclasses import dataclass
+import itertools
+import os
+import sys
+import time
+from typing import BinaryIO, Optional
+import weakref
+
+from . import IncrementalDecoder
+from .parallel import ChunkDecodeError, iter_decode
+
+DEFAULT_BUFFER_SIZE = 1024 * 1024
+
+# Prefix of the names of the error handlers used to count errors, one per Transcoder
+_COUNT_ERRORS = "big5web-main-count"
+_count_errors_ids = itertools.count()
+
+
+class Transcoder:
+    """Decode chunks of big5web into UTF-8, counting bytes and errors."""
+
+    def __init__(self, out: BinaryIO, errors: str = "strict"):
+        self.out = out
+        self.errors = errors
+        self.bytes_read = 0
+        self.error_count = 0
+        handler = codecs.lookup_error(errors)
+        # Error handlers can't be unregistered: don't keep the transcoder alive
+        transcoder = weakref.ref(self)
+
+        def count_error(exc: UnicodeError):
+            counting = transcoder()
+            if counting is not None:
+                counting.error_count += 1
+            return handler(exc)
+
+        # With strict, the first error is raised, so there's nothing to count
+        if errors == "strict":
+            self._decoder = IncrementalDecoder(errors)
+        else:
+            name = f"{_COUNT_ERRORS}-{next(_count_errors_ids)}"
+            codecs.register_error(name, count_error)
+            self._decoder = IncrementalDecoder(name)
+
+    def write(self, text: str):
+        # Surrogates from the surrogateescape handler are written back as bytes
+        self.out.write(text.encode("utf-8", "surrogateescape"))
+
+    def transcode(self, f: BinaryIO, buffer_size: int = DEFAULT_BUFFER_SIZE):
+        """Decode f until the end (where a lead byte is an error)."""
+        # Bytes read from f (bytes_read counts those of every input)
+        position = 0
+        while True:
+            data = f.read(buffer_size)
+            # Position in f of the first pending byte
+            offset = position - len(self._decoder.pending)
+            position += len(data)
+            self.bytes_read += len(data)
+            try:
+                self.write(self._decoder.decode(data, final=not data))
+            except UnicodeDecodeError as exc:
+                error = ChunkDecodeError(
+                    exc.encoding, exc.object, exc.start, exc.end, exc.reason
+                )
+                error.offset = offset
+                raise error from None
+            if not data:
+                break
+        self._decoder.reset()
+
+    def transcode_parallel(self, path: str, workers: Optional[int]):
+        """Decode a whole file with big5web.parallel."""
+        for chunk in iter_decode(path, self.errors, workers=workers):
+            self.write(chunk.text)
+            self.error_count += len(chunk.errors)
+        self.bytes_read += os.path.getsize(path)
+
+
+@dataclass
+class MainCLIArguments:
+    files: "list[str]"
+    output: Optional[str]
+    errors: str
+    workers: Optional[int]
+    buffer_size: int
+    quiet: bool
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog="python -m big5web",
+        description="Transcode big5web files (or standard input) to UTF-8.",
+    )
+    parser.add_argument(
+        "files",
+        nargs="*",
+        metavar="file",
+        help="files to transcode, one after the other (default: standard input)",
+    )
+    parser.add_argument(
+        "-o", "--output", help="path to the output file (default: standard output)"
+    )
+    parser.add_argument(
+        "-e",
+        "--errors",
+        default="strict",
+        help="error handler, like strict, replace or ignore (default: strict)",
+    )
+    parser.add_argument(
+        "-j",
+        "--workers",
+        type=int,
+        help="decode files (not standard input) on this many processes, with "
+        "big5web.parallel",
+    )
+    parser.add_argument(
+        "--buffer-size",
+        type=int,
+        default=DEFAULT_BUFFER_SIZE,
+        help=f"bytes to read at once (default: {DEFAULT_BUFFER_SIZE})",
+    )
+    parser.add_argument(
+        "-q",
+        "--quiet",
+        action="store_true",
+        help="don't print the throughput and number of errors at the end",
+    )
+    args = parser.parse_args(namespace=MainCLIArguments)
+    try:
+        codecs.lookup_error(args.errors)
+    except LookupError as err:
+        parser.error(str(err))
+
+    if args.output:
+        out = open(args.output, "wb", buffering=args.buffer_size)
+    else:
+        out = open(sys.stdout.fileno(), "wb", buffering=args.buffer_size, closefd=False)
+    transcoder = Transcoder(out, args.errors)
+    start_time = time.perf_counter()
+    name = "-"
+    try:
+        with out:
+            for name in args.files or ["-"]:
+                if name == "-":
+                    transcoder.transcode(sys.stdin.buffer, args.buffer_size)
+                elif args.workers:
+                    transcoder.transcode_parallel(name, args.workers)
+                else:
+                    with open(name, "rb", buffering=0) as f:
+                        transcoder.transcode(f, args.buffer_size)  # type: ignore
+    except (OSError, UnicodeDecodeError) as err:
+        print(f"{name}: {err}", file=sys.stderr)
+        sys.exit(1)
+    seconds = time.perf_counter() - start_time
+    if not args.quiet:
+        print(
+            f"big5web: {transcoder.bytes_read} bytes in {seconds:.2f} s "
+            f"({transcoder.bytes_read / seconds / 1e6:.1f} MB/s), "
+            f"{transcoder.error_count} error(s)",
+            file=sys.stderr,
+        )
+
+
+if __name__ == "__main__":
+    main()
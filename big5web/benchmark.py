@@ -0,0 +1,212 @@
+# pyright: strict
+"""Benchmark big5web against the Big5 codecs included in Python.
+
+Synthetic corpora are generated locally (with a fixed seed), and the results are
+written as JSON, so that they can be compared between releases:
+
+  python -m big5web.benchmark --sizes 65536 1048576 -o results.json
+"""
+import argparse
+from dataclasses import asdict, dataclass
+import json
+from pathlib import Path
+import platform
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+from typing import Callable, Optional
+
+import big5web
+
+CODECS = ["big5web", "big5", "cp950", "big5hkscs"]
+CORPORA = ["ascii", "hanzi", "hkscs", "corrupted"]
+DEFAULT_SIZES = [64 * 1024, 1024 * 1024, 16 * 1024 * 1024]
+
+ASCII_WORDS = "the quick brown fox jumps over lazy dog 0123456789 Big5 , . ; :".split()
+
+
+def _hanzi_pointers() -> "list[int]":
+    # Pointers in the "common" and "less common" Big5 ideographs (0xA440-0xF9D5)
+    start = big5web.pointer_for(0xA4, 0x40)
+    end = big5web.pointer_for(0xF9, 0xD5)
+    index = big5web.BIG5_INDEX
+    return [pointer for pointer in range(start, end + 1) if pointer in index]
+
+
+def _hkscs_pointers() -> "list[int]":
+    index = big5web.BIG5_INDEX
+    return [p for p in range(big5web.ENCODE_POINTER_MIN) if p in index]
+
+
+def make_corpus(kind: str, size: int, seed: int = 0) -> bytes:
+    """Generate about size bytes of Big5 text of the given kind (see CORPORA)."""
+    rng = random.Random(seed)
+    parts: list[bytes] = []
+    total = 0
+    if kind == "ascii":
+        while total < size:
+            line = " ".join(rng.choices(ASCII_WORDS, k=12)).encode("ascii") + b"\n"
+            parts.append(line)
+            total += len(line)
+        return b"".join(parts)[:size]
+
+    pointers = _hanzi_pointers()
+    if kind == "hkscs":
+        # Half of the characters are from the HKSCS extensions
+        pointers = pointers[: len(_hkscs_pointers())] + _hkscs_pointers()
+    elif kind not in ("hanzi", "corrupted"):
+        raise ValueError(f"unknown corpus: {kind}")
+    table = {pointer: big5web.bytes_for(pointer) for pointer in pointers}
+    while total < size:
+        line = b"".join(table[p] for p in rng.choices(pointers, k=40)) + b"\n"
+        parts.append(line)
+        total += len(line)
+    data = bytearray(b"".join(parts))
+    if kind == "corrupted":
+        # About 2% of the bytes are replaced by random (often invalid) bytes
+        for _ in range(len(data) // 50):
+            data[rng.randrange(len(data))] = rng.randrange(0x80, 0x100)
+    return bytes(data)
+
+
+def _best_time(func: Callable[[], object], repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def _peak_memory(func: Callable[[], object]) -> int:
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+@dataclass
+class Result:
+    benchmark: str
+    codec: str
+    corpus: Optional[str] = None
+    size: Optional[int] = None
+    seconds: Optional[float] = None
+    mb_per_s: Optional[float] = None
+    peak_memory: Optional[int] = None
+
+
+def bench_codec(
+    codec: str, corpus: str, data: bytes, repeat: int, memory: bool
+) -> "list[Result]":
+    # Also a warm-up, as big5web builds its tables on first use
+    decoded = data.decode(codec, "replace")
+    decoded.encode(codec, "replace")
+    results: list[Result] = []
+    for benchmark, func, size in [
+        ("decode", lambda: data.decode(codec, "replace"), len(data)),
+        ("encode", lambda: decoded.encode(codec, "replace"), len(data)),
+    ]:
+        seconds = _best_time(func, repeat)
+        result = Result(benchmark, codec, corpus, size, seconds, size / seconds / 1e6)
+        if memory:
+            result.peak_memory = _peak_memory(func)
+        results.append(result)
+    return results
+
+
+def bench_import(codec: str, repeat: int) -> Result:
+    """Time to start Python, import the codec and decode the first character."""
+    imports = "import big5web; " if codec == "big5web" else ""
+    code = f"{imports}b'\\xa4\\x40'.decode({codec!r})"
+
+    def run(code: str):
+        # The directory containing the big5web package
+        cwd = Path(big5web.__file__).parent.parent
+        subprocess.run([sys.executable, "-c", code], check=True, cwd=cwd)
+
+    seconds = _best_time(lambda: run(code), repeat) - _best_time(
+        lambda: run("pass"), repeat
+    )
+    return Result("import", codec, seconds=seconds)
+
+
+@dataclass
+class BenchmarkCLIArguments:
+    codecs: "list[str]"
+    corpora: "list[str]"
+    sizes: "list[int]"
+    repeat: int
+    memory: bool
+    output: Optional[str]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog="python -m big5web.benchmark",
+        description="Benchmark big5web against other Big5 codecs, and print the "
+        "results as JSON.",
+    )
+    parser.add_argument("--codecs", nargs="+", default=CODECS, help="codecs to test")
+    parser.add_argument(
+        "--corpora", nargs="+", default=CORPORA, choices=CORPORA, help="corpora to use"
+    )
+    parser.add_argument(
+        "--sizes",
+        nargs="+",
+        type=int,
+        default=DEFAULT_SIZES,
+        help="corpus sizes in bytes",
+    )
+    parser.add_argument(
+        "--repeat", type=int, default=3, help="repetitions (the best time is kept)"
+    )
+    parser.add_argument(
+        "--no-memory",
+        dest="memory",
+        action="store_false",
+        help="don't measure peak memory (which is slow)",
+    )
+    parser.add_argument(
+        "-o", "--output", help="write the JSON results to a file instead of stdout"
+    )
+    args = parser.parse_args(namespace=BenchmarkCLIArguments)
+
+    results: list[Result] = []
+    for codec in args.codecs:
+        results.append(bench_import(codec, args.repeat))
+    for corpus in args.corpora:
+        for size in args.sizes:
+            data = make_corpus(corpus, size)
+            for codec in args.codecs:
+                results_for_codec = bench_codec(
+                    codec, corpus, data, args.repeat, args.memory
+                )
+                for result in results_for_codec:
+                    print(
+                        f"{result.benchmark} {codec} {corpus} {size}: "
+                        f"{result.mb_per_s:.2f} MB/s",
+                        file=sys.stderr,
+                    )
+                    results.append(result)
+
+    report = {
+        "python": sys.version,
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "results": [asdict(result) for result in results],
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,252 @@
+# pyright: strict
+"""Random access to the text of large Big5 files.
+
+A sidecar file records checkpoints every so many bytes: the byte offset, and the
+number of characters and of newlines decoded before it. Checkpoints are taken right
+after a byte below 0x40 (see big5web.parallel), so decoding can restart from any of
+them. To read some lines or characters, only the part of the file between the
+closest checkpoints is decoded, straight from a memory mapping.
+"""
+import argparse
+from array import array
+import bisect
+from dataclasses import dataclass
+import mmap
+import os
+import sys
+from typing import Any, Optional
+
+from . import decode
+from .parallel import split_points
+
+DEFAULT_INTERVAL = 64 * 1024
+SIDECAR_SUFFIX = ".checkpoints"
+
+_EMPTY = b""
+
+
+def _header(errors: str, stat: os.stat_result) -> bytes:
+    # Ties the checkpoints to the error handler (which changes the number of
+    # characters) and to the size and modification time of the file
+    header = f"big5web-checkpoints 1 {errors} {stat.st_size} {stat.st_mtime_ns}\n"
+    return header.encode()
+
+
+def build_checkpoints(
+    data: Any, errors: str = "replace", interval: int = DEFAULT_INTERVAL
+) -> array:
+    """Decode data once, returning its checkpoints.
+
+    The result is a flat array of (byte offset, characters, newlines) triples, with
+    a first checkpoint at 0 and a last one at the end of data. data can be any object
+    supporting the buffer protocol, like an mmap.
+    """
+    checkpoints = array("Q", [0, 0, 0])
+    chars = newlines = 0
+    points = split_points(data, interval)
+    for start, end in zip(points, points[1:]):
+        text, _ = decode(data, errors, start=start, end=end)
+        chars += len(text)
+        newlines += text.count("\n")
+        checkpoints.extend((end, chars, newlines))
+    return checkpoints
+
+
+class CheckpointedFile:
+    """A Big5 file, with checkpoints for random access to its text.
+
+    The checkpoints are read from the sidecar file (by default, the path of the file
+    plus SIDECAR_SUFFIX), or built and saved there if the sidecar is missing or out
+    of date. Lines are only split at "\\n".
+    """
+
+    def __init__(
+        self,
+        path: str,
+        errors: str = "replace",
+        *,
+        interval: int = DEFAULT_INTERVAL,
+        sidecar_path: Optional[str] = None,
+    ):
+        self.errors = errors
+        self._file = open(path, "rb")
+        try:
+            stat = os.fstat(self._file.fileno())
+            if stat.st_size:
+                self._data: Any = mmap.mmap(
+                    self._file.fileno(), 0, access=mmap.ACCESS_READ
+                )
+            else:
+                # Empty files can't be memory mapped
+                self._data = _EMPTY
+            sidecar_path = sidecar_path or path + SIDECAR_SUFFIX
+            header = _header(errors, stat)
+            checkpoints = self._load(sidecar_path, header)
+            if checkpoints is None:
+                checkpoints = build_checkpoints(self._data, errors, interval)
+                self._save(sidecar_path, header, checkpoints)
+        except BaseException:
+            self.close()
+            raise
+        self._bytes = checkpoints[0::3]
+        self._chars = checkpoints[1::3]
+        self._newlines = checkpoints[2::3]
+
+    @staticmethod
+    def _load(sidecar_path: str, header: bytes) -> Optional[array]:
+        try:
+            with open(sidecar_path, "rb") as f:
+                if f.readline() != header:
+                    return None
+                data = f.read()
+        except OSError:
+            return None
+        checkpoints = array("Q")
+        if len(data) % (3 * checkpoints.itemsize):
+            return None
+        checkpoints.frombytes(data)
+        if sys.byteorder != "little":
+            checkpoints.byteswap()
+        return checkpoints
+
+    @staticmethod
+    def _save(sidecar_path: str, header: bytes, checkpoints: array):
+        little_endian = array("Q", checkpoints)
+        if sys.byteorder != "little":
+            little_endian.byteswap()
+        temp_path = f"{sidecar_path}.{os.getpid()}.tmp"
+        try:
+            with open(temp_path, "wb") as f:
+                f.write(header)
+                little_endian.tofile(f)
+            os.replace(temp_path, sidecar_path)
+        except OSError:
+            try:
+                os.unlink(temp_path)
+            except OSError:
+                pass
+
+    def close(self):
+        if getattr(self, "_data", _EMPTY) is not _EMPTY:
+            self._data.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info: object):
+        self.close()
+
+    @property
+    def char_count(self) -> int:
+        return self._chars[-1]
+
+    @property
+    def line_count(self) -> int:
+        """Number of lines, counting the last one even if it doesn't end with \\n."""
+        chars = self.char_count
+        unterminated = chars > 0 and self.read_chars(chars - 1, chars) != "\n"
+        return self._newlines[-1] + unterminated
+
+    def _decode(self, first: int, last: int) -> str:
+        # Decode between two checkpoints
+        start = self._bytes[first]
+        end = self._bytes[min(last, len(self._bytes) - 1)]
+        text, _ = decode(self._data, self.errors, start=start, end=end)
+        return text
+
+    def read_chars(self, start: int, stop: int) -> str:
+        """The text from character start to character stop (excluded)."""
+        if stop <= start:
+            return ""
+        first = bisect.bisect_right(self._chars, start) - 1
+        last = bisect.bisect_left(self._chars, stop)
+        base = self._chars[first]
+        return self._decode(first, last)[start - base : stop - base]
+
+    def read_lines(self, start: int, stop: int) -> str:
+        """The lines from line start to line stop (excluded), including newlines.
+
+        Lines are numbered from 0.
+        """
+        if stop <= start:
+            return ""
+        # The last checkpoint before the newline which starts line start
+        first = max(0, bisect.bisect_left(self._newlines, start) - 1)
+        # The newline ending line stop - 1 comes before this checkpoint
+        last = bisect.bisect_right(self._newlines, stop - 1)
+        base = self._newlines[first]
+        pieces = self._decode(first, last).split("\n")
+        text = "\n".join(pieces[start - base : stop - base])
+        if stop - base < len(pieces):
+            # The last line read is followed by a newline
+            text += "\n"
+        return text
+
+
+### Command line utility ###
+
+
+@dataclass
+class CheckpointsCLIArguments:
+    file: str
+    lines: "Optional[list[int]]"
+    chars: "Optional[list[int]]"
+    errors: str
+    interval: int
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog="python -m big5web.checkpoints",
+        description="Print some lines or characters of a big5web file, decoding only "
+        f"the part around them. Checkpoints are saved in FILE{SIDECAR_SUFFIX}.",
+    )
+    parser.add_argument("file", help="path to the file to read")
+    what = parser.add_mutually_exclusive_group()
+    what.add_argument(
+        "--lines",
+        nargs=2,
+        type=int,
+        metavar=("START", "STOP"),
+        help="print lines from START to STOP (excluded), numbered from 0",
+    )
+    what.add_argument(
+        "--chars",
+        nargs=2,
+        type=int,
+        metavar=("START", "STOP"),
+        help="print characters from START to STOP (excluded)",
+    )
+    parser.add_argument(
+        "-e",
+        "--errors",
+        default="replace",
+        help="error handler, like replace or ignore (default: replace)",
+    )
+    parser.add_argument(
+        "--interval",
+        type=int,
+        default=DEFAULT_INTERVAL,
+        help=f"bytes between checkpoints, when building them (default: "
+        f"{DEFAULT_INTERVAL})",
+    )
+    args = parser.parse_args(namespace=CheckpointsCLIArguments)
+    out = open(sys.stdout.fileno(), "w", encoding="utf-8", newline="", closefd=False)
+    try:
+        with CheckpointedFile(args.file, args.errors, interval=args.interval) as f:
+            if args.lines:
+                out.write(f.read_lines(*args.lines))
+            elif args.chars:
+                out.write(f.read_chars(*args.chars))
+            else:
+                out.write(f"{f.line_count} lines, {f.char_count} characters\n")
+    except (OSError, UnicodeDecodeError) as err:
+        print(err, file=sys.stderr)
+        sys.exit(1)
+    finally:
+        out.close()
+
+
+if __name__ == "__main__":
+    main()
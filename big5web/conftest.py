@@ -1,16 +1,21 @@
 import argparse
 from pathlib import Path
+import tempfile
 from typing import TYPE_CHECKING
 import pytest
 
+from big5web.wpt import WPT_SHARDS, errors_for, write_fixtures
+
 if TYPE_CHECKING:
     from typing import TypeGuard
 
 
 WPT_BIG5_TESTS_PATH = "encoding/legacy-mb-tchinese/big5"
 WPT_PATH_FIXTURE_NAME = "wpt_path"
+WPT_SHARD_FIXTURE_NAME = "wpt_shard"
 
 wpt_path_key = pytest.StashKey[list[Path]]()
+wpt_tests_key = pytest.StashKey[list[Path]]()
 
 
 def is_list_of_paths(o: object) -> "TypeGuard[list[Path]]":
@@ -56,11 +61,20 @@ def pytest_configure(config: pytest.Config):
     if not valid_paths:
         config.issue_config_time_warning(
             pytest.PytestConfigWarning(
-                "no valid web-platform-tests paths given; will skip wpt tests"
+                "no valid web-platform-tests paths given; will only run wpt tests "
+                "on generated files"
             ),
             2,
         )
-    config.stash[wpt_path_key] = valid_paths
+    # Tests generated from index-big5.txt always run. Each pytest-xdist worker
+    # writes them too, which is safe.
+    cache = getattr(config, "cache", None)
+    if cache is not None:
+        generated_dir = Path(cache.mkdir("big5web-wpt"))
+    else:
+        generated_dir = Path(tempfile.gettempdir()) / "big5web-wpt"
+        generated_dir.mkdir(exist_ok=True)
+    config.stash[wpt_path_key] = [*valid_paths, generated_dir]
 
 
 def _get_big5_wpt_tests(path):
@@ -74,15 +88,32 @@ def _get_big5_wpt_tests(path):
     return [*path.glob("big5_chars*.html")]
 
 
-def pytest_generate_tests(metafunc: pytest.Metafunc):
-    if WPT_PATH_FIXTURE_NAME in metafunc.fixturenames:
-        paths = metafunc.config.stash.get(wpt_path_key, [])
-        tests: list[Path] = []
+def _get_all_big5_wpt_tests(config: pytest.Config) -> "list[Path]":
+    tests = config.stash.get(wpt_tests_key, None)
+    if tests is None:
+        *paths, generated_dir = config.stash.get(wpt_path_key, [])
+        tests = []
         for path in paths:
             tests.extend(_get_big5_wpt_tests(path))
+        tests.extend(write_fixtures(generated_dir))
+        config.stash[wpt_tests_key] = tests
+    return tests
+
+
+def pytest_generate_tests(metafunc: pytest.Metafunc):
+    if WPT_PATH_FIXTURE_NAME in metafunc.fixturenames:
+        tests = _get_all_big5_wpt_tests(metafunc.config)
         metafunc.parametrize(
             WPT_PATH_FIXTURE_NAME, tests, ids=[t.stem for t in tests], scope="module"
         )
+    if WPT_SHARD_FIXTURE_NAME in metafunc.fixturenames:
+        tests = _get_all_big5_wpt_tests(metafunc.config)
+        shards = [(test, shard) for test in tests for shard in range(WPT_SHARDS)]
+        metafunc.parametrize(
+            WPT_SHARD_FIXTURE_NAME,
+            shards,
+            ids=[f"{test.stem}-{shard}" for test, shard in shards],
+        )
 
 
 @pytest.fixture(scope="module")
@@ -96,5 +127,5 @@ def wpt_bytes(wpt_path: Path):
 
 
 @pytest.fixture(scope="module")
-def wpt_decoded(wpt_bytes: bytes):
-    return wpt_bytes.decode("big5web")
+def wpt_decoded(wpt_path: Path, wpt_bytes: bytes):
+    return wpt_bytes.decode("big5web", errors_for(wpt_path))
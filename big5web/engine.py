@@ -0,0 +1,420 @@
+# pyright: strict
+"""Table-driven codec for double-byte encodings, shared by big5web and the
+big5hkscs2016 codec.
+
+Input is decoded one run at a time: runs of ASCII bytes directly, and runs of
+possible pairs in bulk, as UTF-16 (one character per pair) translated with a flat
+array of the code point of every pair. Anything else is handled one error at a time
+by the slow path of the codec, which tells where the error is. Text is encoded in
+bulk by codecs.charmap_encode(), with a map from code point to bytes.
+"""
+from array import array
+import bisect
+import codecs
+import itertools
+import re
+from typing import Any, Callable, Mapping, NamedTuple, Sequence, overload
+
+# Bytes of pairs (0x40 and above) are shifted down by 0x40, so that a pair read as a
+# big-endian 16-bit integer is never a surrogate, and a run of pairs can be decoded as
+# UTF-16 into one character for each pair, which is its key in the decode table.
+_SHIFT = bytes((byte - 0x40) % 0x100 for byte in range(0x100))
+PAIR_KEY_COUNT = 0xBF00
+
+
+def pair_key(lead: int, trail: int) -> int:
+    """Key of a pair in DecodeTable.code_points (lead and trail at least 0x40)."""
+    return (lead - 0x40) << 8 | (trail - 0x40)
+
+
+class DecodeTable(NamedTuple):
+    """Code point of each pair, indexed by pair_key(), with 0 for unmapped pairs; and
+    the text of the pairs that decode to more than one character (which are 0 in
+    code_points).
+    """
+
+    code_points: array
+    composed: "dict[int, str]"
+
+    @classmethod
+    def empty(cls) -> "DecodeTable":
+        return cls(array("I", [0]) * PAIR_KEY_COUNT, {})
+
+    def text(self, lead: int, trail: int) -> "str | None":
+        """Text of a pair, None if unmapped."""
+        key = pair_key(lead, trail)
+        cp = self.code_points[key]
+        return chr(cp) if cp else self.composed.get(key)
+
+
+# Given the input and the position of a byte that doesn't start a run, the position
+# and reason of the error (which is one byte long), and the number of bytes before
+# the position given by the error handler to resume from; or None to stop decoding
+# there, leaving the rest of the input to be decoded with more input.
+SlowPath = Callable[[memoryview, int, bool], "tuple[int, str, int] | None"]
+
+# Map from code point to bytes for charmap_encode(), a pattern matching runs of
+# encodable characters and one matching the characters reported in an error.
+EncodeTables = tuple["dict[int, bytes]", "re.Pattern[str]", "re.Pattern[str]"]
+
+
+# Replacements for the standard error handlers, given the input and the position of
+# the error, so that decoding dirty input doesn't need to create an exception for
+# each error. None means that the handler would raise.
+_FAST_ERROR_HANDLERS: "dict[str, Callable[[memoryview, int], str | None]]" = {
+    "replace": lambda data, start: "\ufffd",
+    "ignore": lambda data, start: "",
+    "backslashreplace": lambda data, start: f"\\x{data[start]:02x}",
+    "surrogateescape": lambda data, start: (
+        chr(0xDC00 + data[start]) if data[start] >= 0x80 else None
+    ),
+}
+
+
+class SourceOffsets(Sequence[int]):
+    """Position in the input of each character decoded by decode_with_offsets().
+
+    Positions are stored compactly as segments of characters, each one step bytes
+    after the previous one: step is 1 in runs of ASCII, 2 in runs of pairs, and 0 for
+    the characters of an error replacement (which all come from the byte in error) or
+    of a pair decoding to two characters.
+    """
+
+    def __init__(self):
+        # Index of the first character, its position and the step of each segment
+        self._starts = array("Q")
+        self._offsets = array("Q")
+        self._steps = array("B")
+        self._length = 0
+
+    def add(self, offset: int, step: int, count: int):
+        if count:
+            self._starts.append(self._length)
+            self._offsets.append(offset)
+            self._steps.append(step)
+            self._length += count
+
+    @overload
+    def __getitem__(self, index: int) -> int:
+        ...
+
+    @overload
+    def __getitem__(self, index: slice) -> "list[int]":
+        ...
+
+    def __getitem__(self, index: "int | slice") -> "int | list[int]":
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(self._length))]
+        if index < 0:
+            index += self._length
+        if not 0 <= index < self._length:
+            raise IndexError("index out of range")
+        segment = bisect.bisect_right(self._starts, index) - 1
+        step = self._steps[segment]
+        return self._offsets[segment] + (index - self._starts[segment]) * step
+
+    def __len__(self) -> int:
+        return self._length
+
+    def to_array(self) -> array:
+        """Position of each character, in an array of 32-bit integers if possible."""
+        last = self[-1] if self._length else 0
+        offsets = array("I" if last <= 0xFFFFFFFF else "Q")
+        ends = [*self._starts[1:], self._length]
+        for start, end, offset, step in zip(
+            self._starts, ends, self._offsets, self._steps
+        ):
+            count = end - start
+            if step:
+                offsets.extend(range(offset, offset + count * step, step))
+            else:
+                offsets.extend(itertools.repeat(offset, count))
+        return offsets
+
+
+def _charmap_encode(input: str, encoding_map: "dict[int, bytes]") -> bytes:
+    return codecs.charmap_encode(input, "strict", encoding_map)[0]  # type: ignore
+
+
+class TableCodec:
+    """Decoder and encoder of a double-byte encoding, described by its tables.
+
+    decode_table() returns the DecodeTable, and run matches either a run of ASCII
+    bytes (group 1) or a run of pairs which might be mapped. encode_tables()
+    returns EncodeTables. Both are only called when needed, and should cache their
+    result. composed maps texts of more than one character to their pair, which
+    charmap_encode() can't encode.
+    """
+
+    def __init__(
+        self,
+        encoding: str,
+        decode_table: Callable[[], DecodeTable],
+        run: "re.Pattern[bytes]",
+        slow_path: SlowPath,
+        encode_tables: Callable[[], EncodeTables],
+        composed: "Mapping[str, bytes] | None" = None,
+    ):
+        self.encoding = encoding
+        self.decode_table = decode_table
+        self.run = run
+        self.slow_path = slow_path
+        self.encode_tables = encode_tables
+        self.composed = dict(composed or {})
+        self._composed_pattern = (
+            re.compile("|".join(map(re.escape, self.composed))) if composed else None
+        )
+
+    def decode(
+        self,
+        input: bytes,
+        errors: str = "strict",
+        final: bool = True,
+        *,
+        start: int = 0,
+        end: "int | None" = None,
+    ) -> "tuple[str, int]":
+        """Decode input[start:end], which can be any buffer, without copying it."""
+        # The views are released before returning (or raising), so that e.g. an mmap
+        # can be closed right after.
+        with memoryview(input) as view, view.cast("B") as octets:
+            with octets[start:end] as data:
+                if isinstance(input, bytes) and len(data) == len(input):
+                    error_object = input
+                else:
+                    # Only the window is copied, on the first error (if any)
+                    error_object = data
+                return self.decode_view(data, error_object, errors, final)
+
+    def decode_view(
+        self,
+        data: memoryview,
+        error_object: Any,
+        errors: str,
+        final: bool,
+        offsets: "SourceOffsets | None" = None,
+    ) -> "tuple[str, int]":
+        """Decode data, a view of bytes. Errors are reported on error_object."""
+        error_handler = codecs.lookup_error(errors)
+        length = len(data)
+        parts: list[str] = []
+        append = parts.append
+        match_run = self.run.match
+        code_points, composed = self.decode_table()
+        slow_path = self.slow_path
+        fast_error_handler = _FAST_ERROR_HANDLERS.get(errors)
+
+        def error(start: int, reason: str) -> int:
+            nonlocal error_object
+            if fast_error_handler is not None:
+                replacement = fast_error_handler(data, start)
+                if replacement is not None:
+                    append(replacement)
+                    if offsets is not None:
+                        offsets.add(start, 0, len(replacement))
+                    return start + 1
+            if not isinstance(error_object, bytes):
+                # Otherwise each exception would copy it again
+                error_object = bytes(error_object)
+            exc = UnicodeDecodeError(
+                self.encoding, error_object, start, start + 1, reason
+            )
+            replacement, newpos = error_handler(exc)
+            if isinstance(replacement, bytes):
+                replacement = replacement.decode("ascii")
+            append(replacement)
+            if offsets is not None:
+                offsets.add(start, 0, len(replacement))
+            if newpos < 0:
+                newpos += length
+            return newpos
+
+        pos = 0
+        while pos < length:
+            match = match_run(data, pos)
+            if match is not None:
+                end = match.end()
+                if match.lastindex == 1:
+                    append(str(data[pos:end], "ascii"))
+                    if offsets is not None:
+                        offsets.add(pos, 1, end - pos)
+                    pos = end
+                    continue
+                shifted = data[pos:end].tobytes().translate(_SHIFT)
+                decoded = codecs.utf_16_be_decode(shifted)[0].translate(code_points)
+                # Keep everything up to the first unmapped pair (decoded as U+0000,
+                # which no pair decodes to), then look at that one alone.
+                unmapped = decoded.find("\0")
+                if unmapped >= 0:
+                    decoded = decoded[:unmapped]
+                    end = pos + 2 * unmapped
+                append(decoded)
+                if offsets is not None:
+                    offsets.add(pos, 2, len(decoded))
+                pos = end
+                if pos == match.end():
+                    continue
+                text = composed.get(pair_key(data[pos], data[pos + 1]))
+                if text is not None:
+                    append(text)
+                    if offsets is not None:
+                        offsets.add(pos, 0, len(text))
+                    pos += 2
+                    continue
+
+            slow = slow_path(data, pos, final)
+            if slow is None:
+                break
+            start, reason, unread = slow
+            pos = error(start, reason) - unread
+        return ("".join(parts), pos)
+
+    def encode(self, input: str, errors: str = "strict") -> "tuple[bytes, int]":
+        encoding_map, encodable_run, unencodable = self.encode_tables()
+        try:
+            # charmap_encode() does all the work in bulk, but its errors would be
+            # reported as coming from the "charmap" codec, so they are handled below.
+            # The characters of composed texts are never all encodable alone, so
+            # those are also handled below.
+            return (_charmap_encode(input, encoding_map), len(input))
+        except UnicodeEncodeError:
+            pass
+
+        error_handler = codecs.lookup_error(errors)
+        composed = self._composed_pattern
+        parts: list[bytes] = []
+        length = len(input)
+        pos = 0
+        while pos < length:
+            end = encodable_run.match(input, pos).end()  # type: ignore
+            # Stop at the first composed text, which charmap_encode() would split
+            match = None
+            if composed is not None:
+                match = composed.search(input, pos, end + 1)
+                if match is not None:
+                    end = match.start()
+            if pos < end:
+                parts.append(_charmap_encode(input[pos:end], encoding_map))
+            if match is not None:
+                parts.append(self.composed[match.group()])
+                pos = match.end()
+                continue
+            if end == length:
+                break
+            bad = unencodable.match(input, end)
+            assert bad is not None
+            exc = UnicodeEncodeError(
+                self.encoding, input, end, bad.end(), "illegal multibyte sequence"
+            )
+            replacement, pos = error_handler(exc)
+            if isinstance(replacement, str):
+                try:
+                    replacement = _charmap_encode(replacement, encoding_map)
+                except UnicodeEncodeError:
+                    raise exc from None
+            parts.append(replacement)
+            if pos < 0:
+                pos += length
+        return (b"".join(parts), length)
+
+
+# Base classes for the incremental and stream classes of the codecs. The functions of
+# the codec are called through decode_input() and encode_input(), which subclasses
+# implement.
+
+
+class IncrementalEncoder(codecs.IncrementalEncoder):
+    # Characters which might start a composed text: at the end of input, they are
+    # kept until more input comes.
+    pending_chars = ""
+
+    def __init__(self, errors: str = "strict"):
+        super().__init__(errors)
+        self.pending = ""
+
+    def encode_input(self, input: str, errors: str) -> "tuple[bytes, int]":
+        raise NotImplementedError
+
+    def encode(self, input: str, final: bool = False) -> bytes:
+        input = self.pending + input
+        self.pending = ""
+        if not final and input[-1:] and input[-1] in self.pending_chars:
+            input, self.pending = input[:-1], input[-1:]
+        return self.encode_input(input, self.errors)[0]
+
+    def reset(self):
+        self.pending = ""
+
+    def getstate(self) -> int:
+        return ord(self.pending) if self.pending else 0
+
+    def setstate(self, state: int):
+        self.pending = chr(state) if state else ""
+
+
+class IncrementalDecoder(codecs.IncrementalDecoder):
+    def __init__(self, errors: str = "strict"):
+        super().__init__(errors)
+        # Either empty, or a lead byte left over from the previous input.
+        self.pending = b""
+
+    def decode_input(
+        self, input: bytes, errors: str, final: bool
+    ) -> "tuple[str, int]":
+        raise NotImplementedError
+
+    def decode(self, input: bytes, final: bool = False) -> str:
+        if self.pending:
+            input = self.pending + input
+        output, consumed = self.decode_input(input, self.errors, final)
+        self.pending = bytes(input[consumed:])
+        return output
+
+    def reset(self):
+        self.pending = b""
+
+    def getstate(self) -> "tuple[bytes, int]":
+        return (self.pending, 0)
+
+    def setstate(self, state: "tuple[bytes, int]"):
+        self.pending = state[0]
+
+
+class StreamWriter(codecs.StreamWriter):
+    def encode_input(self, input: str, errors: str) -> "tuple[bytes, int]":
+        raise NotImplementedError
+
+    def encode(self, input: str, errors: str = "strict"):
+        return self.encode_input(input, errors)
+
+
+class StreamReader(codecs.StreamReader):
+    # Minimum number of bytes read from the stream at once. codecs.StreamReader
+    # would read 72 bytes at a time in readline() and when iterating over lines.
+    chunk_size = 64 * 1024
+
+    def __init__(
+        self, stream: Any, errors: str = "strict", chunk_size: "int | None" = None
+    ):
+        super().__init__(stream, errors)
+        if chunk_size is not None:
+            self.chunk_size = chunk_size
+
+    def decode_input(
+        self, input: bytes, errors: str, final: bool
+    ) -> "tuple[str, int]":
+        raise NotImplementedError
+
+    def decode(self, input: bytes, errors: str = "strict"):
+        # codecs.StreamReader.read() decodes the leftover bytes together with newly
+        # read data, so if there's nothing but the leftover, the stream is exhausted
+        # and an incomplete sequence is an error.
+        final = len(input) == len(self.bytebuffer)
+        return self.decode_input(input, errors, final)
+
+    def read(self, size: int = -1, chars: int = -1, firstline: bool = False) -> str:
+        if chars < 0:
+            chars = size
+        if 0 <= size < self.chunk_size:
+            size = self.chunk_size
+        return super().read(size, chars, firstline)
@@ -0,0 +1,269 @@
+# pyright: strict
+"""Differential fuzzing of the big5web decoder.
+
+Random inputs, made of the byte sequences most likely to trip the decoder (lone lead
+bytes, bytes in 0x7F-0xA0 after a lead, unmapped pointers, double characters...),
+are decoded by a plain implementation of the WHATWG decoder steps, one byte at a
+time, and by each optimized path of big5web: the results, the number of bytes
+consumed, and the positions and reasons of errors must be the same.
+
+  python -m big5web.fuzz --inputs 100000 --seed 42
+"""
+import argparse
+import codecs
+from dataclasses import dataclass, field
+import functools
+import random
+import sys
+import time
+from typing import Callable, Optional
+
+import big5web
+
+
+@functools.cache
+def _reference_index() -> "dict[int, str]":
+    # Parsed from index-big5.txt, rather than big5web.BIG5_INDEX, which is the
+    # compiled index under test
+    return big5web.load_big5_index()
+
+
+def _replacement_character(pos: int) -> str:
+    return "\ufffd"
+
+
+def reference_decode(
+    data: bytes,
+    final: bool = True,
+    replace: Callable[[int], str] = _replacement_character,
+) -> "tuple[str, int, list[tuple[int, str]]]":
+    """Decode data following the steps of the WHATWG Big5 decoder.
+
+    Returns the decoded text, the number of bytes consumed and the errors, like the
+    ones reported to error handlers (which are all one byte long). replace gives the
+    replacement for an error at some position.
+    """
+    index = _reference_index()
+    output: list[str] = []
+    errors: list[tuple[int, str]] = []
+
+    def error(pos: int, reason: str):
+        errors.append((pos, reason))
+        output.append(replace(pos))
+
+    lead = 0
+    pos = 0
+    while pos < len(data):
+        byte = data[pos]
+        if lead != 0:
+            pointer = None
+            offset = 0x40 if byte < 0x7F else 0x62
+            if 0x40 <= byte <= 0x7E or 0xA1 <= byte <= 0xFE:
+                pointer = (lead - 0x81) * 157 + (byte - offset)
+            lead = 0
+            if pointer in big5web.DOUBLE_CHAR_TABLE:
+                output.append(big5web.DOUBLE_CHAR_TABLE[pointer])
+            elif pointer is not None and pointer in index:
+                output.append(index[pointer])
+            else:
+                error(pos, "illegal multibyte sequence")
+                if byte < 0x80:
+                    # Prepend byte to the stream: read it again
+                    continue
+            pos += 1
+        elif byte < 0x80:
+            output.append(chr(byte))
+            pos += 1
+        elif 0x81 <= byte <= 0xFE:
+            lead = byte
+            pos += 1
+        else:
+            error(pos, "invalid start byte")
+            pos += 1
+    if lead != 0:
+        if final:
+            error(pos - 1, "incomplete multibyte sequence")
+        else:
+            pos -= 1
+    return "".join(output), pos, errors
+
+
+class InputGenerator:
+    """Random inputs, biased towards the sequences that matter to the decoder."""
+
+    def __init__(self, seed: int = 0, max_length: int = 40):
+        self.random = random.Random(seed)
+        self.max_length = max_length
+        index = _reference_index()
+        pointers = range(big5web.POINTER_COUNT)
+        self.mapped = [p for p in pointers if p in index]
+        self.unmapped = [p for p in pointers if p not in index]
+        self.pieces: list[Callable[[], bytes]] = [
+            # ASCII, including the bytes that are also trail bytes
+            lambda: bytes((self.random.randrange(0x80),)),
+            lambda: bytes((self.random.randrange(0x40, 0x80),)),
+            # Lone lead bytes, and bytes that are never valid
+            lambda: bytes((self.random.randrange(0x81, 0xFF),)),
+            lambda: self.random.choice([b"\x80", b"\xff"]),
+            # Bytes that are only valid as trail bytes, or not even
+            lambda: bytes((self.random.randrange(0x7F, 0xA1),)),
+            lambda: bytes((self.random.randrange(0xA1, 0xFF),)),
+            # Pairs
+            lambda: big5web.bytes_for(self.random.choice(self.mapped)),
+            lambda: big5web.bytes_for(self.random.choice(self.unmapped)),
+            lambda: big5web.bytes_for(
+                self.random.choice([*big5web.DOUBLE_CHAR_TABLE])
+            ),
+            # Anything
+            lambda: self.random.randbytes(self.random.randrange(1, 4)),
+        ]
+
+    def __call__(self) -> bytes:
+        count = self.random.randrange(self.max_length)
+        return b"".join(self.random.choice(self.pieces)() for _ in range(count))
+
+    def split(self, data: bytes) -> "list[bytes]":
+        """Split data at random positions, as chunks for the incremental decoder."""
+        cuts = sorted(self.random.sample(range(len(data) + 1), min(len(data), 4)))
+        return [data[start:end] for start, end in zip([0, *cuts], [*cuts, len(data)])]
+
+
+def _recorded_decode(
+    data: "bytes | bytearray", errors: str, final: bool = True
+) -> "tuple[str, int, list[tuple[int, str]]]":
+    # Decode with a handler like errors, but which also records the errors
+    handler = codecs.lookup_error(errors)
+    recorded: list[tuple[int, str]] = []
+
+    def record(exc: UnicodeError):
+        assert isinstance(exc, UnicodeDecodeError)
+        recorded.append((exc.start, exc.reason))
+        return handler(exc)
+
+    codecs.register_error("big5web-fuzz-record", record)
+    text, consumed = big5web.decode(data, "big5web-fuzz-record", final)
+    return text, consumed, recorded
+
+
+def check(data: bytes, chunks: "list[bytes]") -> "list[str]":
+    """Compare the reference decoder with big5web on data. Returns the differences."""
+    problems: list[str] = []
+
+    def compare(what: str, actual: object, expected: object):
+        if actual != expected:
+            problems.append(f"{what}: {actual!r} != {expected!r}")
+
+    expected = reference_decode(data)
+    text, consumed, errors = expected
+
+    compare("replace", big5web.decode(data, "replace"), (text, consumed))
+    compare("recorded errors", _recorded_decode(data, "replace"), expected)
+    compare("bytearray", _recorded_decode(bytearray(data), "ignore")[2], errors)
+    compare(
+        "backslashreplace",
+        big5web.decode(data, "backslashreplace")[0],
+        reference_decode(data, replace=lambda pos: f"\\x{data[pos]:02x}")[0],
+    )
+    compare(
+        "not final",
+        _recorded_decode(data, "replace", False),
+        reference_decode(data, False),
+    )
+    try:
+        big5web.decode(data)
+        compare("strict", [], errors[:1])
+    except UnicodeDecodeError as exc:
+        compare("strict", [(exc.start, exc.reason)], errors[:1])
+        compare("strict end", exc.end, exc.start + 1)
+    compare("find_errors", big5web.find_errors(data), errors)
+    compare("validate", big5web.validate(data), not errors)
+    offsets_text, offsets = big5web.decode_with_offsets(data, "replace")
+    compare("decode_with_offsets", offsets_text, text)
+    compare("offsets", len(offsets), len(text))
+    compare("decode_many", big5web.decode_many([data, data], "replace"), [text, text])
+
+    decoder = big5web.IncrementalDecoder("replace")
+    decoded = [decoder.decode(chunk) for chunk in chunks]
+    decoded.append(decoder.decode(b"", final=True))
+    compare(f"incremental {chunks!r}", "".join(decoded), text)
+    return problems
+
+
+@dataclass
+class FuzzReport:
+    inputs: int = 0
+    bytes: int = 0
+    seconds: float = 0.0
+    # Inputs for which big5web differs from the reference, with the differences
+    failures: "list[tuple[bytes, list[str]]]" = field(default_factory=list)
+
+    @property
+    def inputs_per_second(self) -> float:
+        return self.inputs / self.seconds if self.seconds else 0.0
+
+
+def fuzz(
+    inputs: int,
+    seed: int = 0,
+    max_length: int = 40,
+    max_failures: Optional[int] = 10,
+) -> FuzzReport:
+    """Check inputs random inputs, stopping after max_failures failures."""
+    generate = InputGenerator(seed, max_length)
+    report = FuzzReport()
+    start = time.perf_counter()
+    for _ in range(inputs):
+        data = generate()
+        problems = check(data, generate.split(data))
+        report.inputs += 1
+        report.bytes += len(data)
+        if problems:
+            report.failures.append((data, problems))
+            if max_failures is not None and len(report.failures) >= max_failures:
+                break
+    report.seconds = time.perf_counter() - start
+    return report
+
+
+### Command line utility ###
+
+
+@dataclass
+class FuzzCLIArguments:
+    inputs: int
+    seed: int
+    max_length: int
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog="python -m big5web.fuzz",
+        description="Compare the big5web decoder with a reference implementation on "
+        "random inputs.",
+    )
+    parser.add_argument(
+        "-n", "--inputs", type=int, default=10000, help="number of inputs to check"
+    )
+    parser.add_argument("--seed", type=int, default=0, help="random seed")
+    parser.add_argument(
+        "--max-length",
+        type=int,
+        default=40,
+        help="maximum number of pieces in each input",
+    )
+    args = parser.parse_args(namespace=FuzzCLIArguments)
+    report = fuzz(args.inputs, args.seed, args.max_length)
+    for data, problems in report.failures:
+        print(f"input {data.hex(' ')}:", file=sys.stderr)
+        for problem in problems:
+            print(f"  {problem}", file=sys.stderr)
+    print(
+        f"{report.inputs} inputs ({report.bytes} bytes) in {report.seconds:.2f} s, "
+        f"{report.inputs_per_second:.0f} inputs/s, {len(report.failures)} failure(s)"
+    )
+    if report.failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,231 @@
+# pyright: strict
+"""Decode large Big5 inputs on multiple cores.
+
+No byte below 0x40 can be a trail byte: after such a byte, the decoder is never
+waiting for a trail byte (either the byte was ASCII, or it was an invalid trail byte
+which is then read again as ASCII). So the input can be split right after any of them
+into chunks that are decoded independently, and the results just concatenated.
+"""
+import argparse
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+import codecs
+from dataclasses import dataclass
+import mmap
+import os
+from pathlib import Path
+import re
+import sys
+from typing import Iterator, NamedTuple, Optional, Union
+
+from . import decode
+
+DEFAULT_CHUNK_SIZE = 16 * 1024 * 1024
+
+_SAFE_BYTE = re.compile(rb"[\x00-\x3f]")
+
+# Name of the error handler used by the workers to record errors
+_RECORD_ERRORS = "big5web-parallel-record"
+
+
+class ChunkDecodeError(UnicodeDecodeError):
+    """UnicodeDecodeError for a chunk of a larger input.
+
+    As in any UnicodeDecodeError, start and end are positions in object, which is the
+    chunk. The chunk starts at offset in the input.
+    """
+
+    offset: int = 0
+
+    def __str__(self):
+        position = self.offset + self.start
+        return f"{super().__str__()} (at offset {position} of the input)"
+
+
+class DecodedChunk(NamedTuple):
+    offset: int
+    text: str
+    # Offset in the input and reason for each decoding error
+    errors: "list[tuple[int, str]]"
+
+
+def split_points(data: bytes, chunk_size: int = DEFAULT_CHUNK_SIZE) -> "list[int]":
+    """Offsets where data can be split into chunks that decode independently.
+
+    The first offset is always 0 and the last one is the length of data. Chunks are at
+    least chunk_size bytes long (except for the last one), but they can be much longer
+    if no split point is found.
+    """
+    length = len(data)
+    points = [0]
+    pos = chunk_size
+    while pos < length:
+        match = _SAFE_BYTE.search(data, pos - 1)
+        if match is None:
+            break
+        pos = match.end()
+        if pos < length:
+            points.append(pos)
+        pos += chunk_size
+    points.append(length)
+    return points
+
+
+def _decode_chunk(chunk: bytes, offset: int, errors: str) -> DecodedChunk:
+    handler = codecs.lookup_error(errors)
+    error_offsets: list[tuple[int, str]] = []
+
+    def record_error(exc: UnicodeError):
+        assert isinstance(exc, UnicodeDecodeError)
+        error_offsets.append((offset + exc.start, exc.reason))
+        return handler(exc)
+
+    # Workers only decode one chunk at a time, so it's safe to replace the handler
+    codecs.register_error(_RECORD_ERRORS, record_error)
+    try:
+        text, _ = decode(chunk, _RECORD_ERRORS)
+    except UnicodeDecodeError as exc:
+        error = ChunkDecodeError(
+            exc.encoding, exc.object, exc.start, exc.end, exc.reason
+        )
+        error.offset = offset
+        raise error from None
+    return DecodedChunk(offset, text, error_offsets)
+
+
+def _decode_file_chunk(path: str, start: int, end: int, errors: str) -> DecodedChunk:
+    with open(path, "rb") as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            with memoryview(mm)[start:end] as chunk:
+                return _decode_chunk(chunk, start, errors)  # type: ignore
+
+
+def iter_decode(
+    source: "Union[bytes, str, os.PathLike[str]]",
+    errors: str = "strict",
+    *,
+    workers: Optional[int] = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> Iterator[DecodedChunk]:
+    """Decode source in parallel, yielding the decoded chunks in order.
+
+    source is either a bytes-like object or the path of a file. Files are memory
+    mapped, and each worker decodes its own chunks straight from the mapping. At most
+    two chunks per worker are decoded ahead of the consumer.
+
+    Error handlers are called in the worker processes, and they only see the chunk
+    being decoded; so errors must be the name of a handler which is registered in the
+    workers too, and which doesn't move the position out of the chunk (the standard
+    handlers are fine). With "strict", a ChunkDecodeError is raised.
+    """
+    codecs.lookup_error(errors)
+    workers = workers or os.cpu_count() or 1
+    if isinstance(source, (str, os.PathLike)):
+        path = os.fspath(source)
+        with open(path, "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                points = split_points(mm, chunk_size)  # type: ignore
+    else:
+        path = None
+        points = split_points(source, chunk_size)
+    data = memoryview(source) if path is None else None
+
+    with ProcessPoolExecutor(workers) as executor:
+        pending: deque[Future[DecodedChunk]] = deque()
+        for start, end in zip(points, points[1:]):
+            if data is None:
+                future = executor.submit(
+                    _decode_file_chunk, path, start, end, errors  # type: ignore
+                )
+            else:
+                chunk = data[start:end].tobytes()
+                future = executor.submit(_decode_chunk, chunk, start, errors)
+            pending.append(future)
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def decode_parallel(
+    source: "Union[bytes, str, os.PathLike[str]]",
+    errors: str = "strict",
+    *,
+    workers: Optional[int] = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> str:
+    """Decode source in parallel. See iter_decode()."""
+    chunks = iter_decode(source, errors, workers=workers, chunk_size=chunk_size)
+    return "".join(chunk.text for chunk in chunks)
+
+
+### Command line utility ###
+
+
+@dataclass
+class ParallelCLIArguments:
+    file: str
+    output: Optional[str]
+    errors: str
+    workers: Optional[int]
+    chunk_size: int
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog="python -m big5web.parallel",
+        description="Decode a big5web file on multiple cores and write it as UTF-8.",
+    )
+    parser.add_argument("file", help="path to the file to decode")
+    parser.add_argument(
+        "-o", "--output", help="path to the output file (default: standard output)"
+    )
+    parser.add_argument(
+        "-e",
+        "--errors",
+        default="strict",
+        help="error handler, like strict, replace or ignore (default: strict)",
+    )
+    parser.add_argument(
+        "-j",
+        "--workers",
+        type=int,
+        help="number of worker processes (default: number of CPUs)",
+    )
+    parser.add_argument(
+        "--chunk-size",
+        type=int,
+        default=DEFAULT_CHUNK_SIZE,
+        help=f"approximate size of each chunk in bytes (default: {DEFAULT_CHUNK_SIZE})",
+    )
+    args = parser.parse_args(namespace=ParallelCLIArguments)
+    if args.output:
+        out = open(args.output, "w", encoding="utf-8", newline="")
+    else:
+        out = open(
+            sys.stdout.fileno(), "w", encoding="utf-8", newline="", closefd=False
+        )
+    error_count = 0
+    with out:
+        try:
+            for chunk in iter_decode(
+                Path(args.file),
+                args.errors,
+                workers=args.workers,
+                chunk_size=args.chunk_size,
+            ):
+                out.write(chunk.text)
+                for offset, reason in chunk.errors:
+                    print(f"{args.file}: offset {offset}: {reason}", file=sys.stderr)
+                error_count += len(chunk.errors)
+        except (OSError, UnicodeDecodeError) as err:
+            print(err, file=sys.stderr)
+            sys.exit(1)
+    if error_count:
+        print(f"{args.file}: {error_count} error(s)", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
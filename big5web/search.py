@@ -0,0 +1,201 @@
+# pyright: strict
+"""Search Big5 text without decoding it.
+
+The needle is encoded once, and its bytes are searched in the input. A match is only
+a hit if it starts where the decoder would start a character, and not on the trail
+byte of a pair: to check that, the input is decoded (without building any text) from
+the closest position before the match where the decoder can't be waiting for a
+trail byte, which is after any byte below 0x40 (see big5web.parallel).
+"""
+import argparse
+from dataclasses import dataclass
+import mmap
+import re
+import sys
+from typing import Iterator, NamedTuple, Union
+
+from . import _decode_table, _valid_prefix, decode
+
+DEFAULT_CONTEXT = 80
+
+_SAFE_BYTE = re.compile(rb"[\x00-\x3f]")
+
+# Matches up to the last byte below 0x40 (included), when searching backwards
+_LAST_SAFE_BYTE = re.compile(rb".*[\x00-\x3f]", re.DOTALL)
+
+# How far to look back for a byte below 0x40 at first
+_LOOKBEHIND = 256
+
+
+class Hit(NamedTuple):
+    offset: int
+    # Decoded text around the hit, within the same line
+    context: str
+
+
+def _safe_start(data: "bytes | memoryview", pos: int, lowest: int) -> int:
+    # Closest position at or before pos (and not before lowest) right after a byte
+    # below 0x40, or lowest if there's none.
+    size = _LOOKBEHIND
+    end = pos
+    while end > lowest:
+        start = max(lowest, end - size)
+        match = _LAST_SAFE_BYTE.match(data, start, end)
+        if match is not None:
+            return match.end()
+        end = start
+        size *= 2
+    return lowest
+
+
+def _next_position(data: "bytes | memoryview", pos: int) -> int:
+    # Position where the decoder continues after the sequence at pos, which is not
+    # valid, or is a valid pair cut by a search window. Same as in find_errors().
+    lead = data[pos]
+    if not 0x81 <= lead <= 0xFE or pos + 1 == len(data):
+        return pos + 1
+    trail = data[pos + 1]
+    if trail >= 0x80:
+        return pos + 2
+    if trail >= 0x40 and _decode_table().text(lead, trail) is not None:
+        return pos + 2
+    return pos + 1
+
+
+def is_boundary(data: "bytes | memoryview", pos: int, start: int = 0) -> bool:
+    """Whether the decoder would start a character at pos, when decoding from start.
+
+    start must be a position where the decoder starts a character. Errors are assumed
+    to be handled by skipping the byte in error, like the standard error handlers do.
+    """
+    match_valid = _valid_prefix().match
+    pos_start = _safe_start(data, pos, start)
+    while True:
+        pos_start = match_valid(data, pos_start, pos).end()  # type: ignore
+        if pos_start >= pos:
+            return pos_start == pos
+        pos_start = _next_position(data, pos_start)
+
+
+def _context(data: "bytes | memoryview", start: int, end: int, size: int) -> str:
+    # The decoded line around data[start:end], with at most about size bytes before
+    # and after it
+    window_start = max(0, start - size)
+    newline = bytes(data[window_start:start]).rfind(b"\n")
+    if newline != -1:
+        line_start = window_start + newline + 1
+    elif window_start == 0:
+        line_start = 0
+    else:
+        # The earliest position where the decoder can't be in the middle of a pair,
+        # if any
+        safe = _SAFE_BYTE.search(data, window_start, start)
+        line_start = start if safe is None else safe.end()
+    line_end = min(len(data), end + size)
+    newline = bytes(data[end:line_end]).find(b"\n")
+    if newline != -1:
+        line_end = end + newline
+    # The window might end with a lead byte, which is left out
+    text, _ = decode(data, "replace", False, start=line_start, end=line_end)
+    return text.rstrip("\r")
+
+
+def search(
+    data: bytes,
+    needle: "Union[str, bytes]",
+    *,
+    context: int = DEFAULT_CONTEXT,
+) -> Iterator[Hit]:
+    """Find the positions where needle is in the text encoded as data.
+
+    data can be any object supporting the buffer protocol, like an mmap. needle is
+    either text, which is encoded with big5web, or its already encoded bytes. Only
+    the first encoding of each character is searched for, so the few characters which
+    are in the index twice are only found in one form.
+
+    Each hit includes the decoded line around it, with at most context bytes on each
+    side (no context at all if context is 0, which is faster).
+    """
+    if isinstance(needle, str):
+        needle = needle.encode("big5web")
+    if not needle:
+        raise ValueError("empty needle")
+    pattern = re.compile(re.escape(needle))
+    with memoryview(data) as view, view.cast("B") as octets:
+        # The last known position where the decoder starts a character
+        boundary = 0
+        for match in pattern.finditer(octets):
+            pos = match.start()
+            if pos < boundary or not is_boundary(octets, pos, boundary):
+                continue
+            # needle is valid text, so it also ends on a boundary
+            boundary = match.end()
+            text = _context(octets, pos, boundary, context) if context > 0 else ""
+            yield Hit(pos, text)
+
+
+def search_file(
+    path: str, needle: "Union[str, bytes]", *, context: int = DEFAULT_CONTEXT
+) -> Iterator[Hit]:
+    """Like search(), on the contents of a file, which is memory mapped."""
+    with open(path, "rb") as f:
+        if f.seek(0, 2) == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            yield from search(mm, needle, context=context)  # type: ignore
+
+
+### Command line utility ###
+
+
+@dataclass
+class SearchCLIArguments:
+    needle: str
+    files: "list[str]"
+    count: bool
+    context: int
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog="python -m big5web.search",
+        description="Search big5web files for some text, without decoding them, and "
+        "print the offset and line of each hit (like grep).",
+    )
+    parser.add_argument("needle", help="text to search for")
+    parser.add_argument("files", nargs="+", metavar="file", help="files to search")
+    parser.add_argument(
+        "-c", "--count", action="store_true", help="only print the number of hits"
+    )
+    parser.add_argument(
+        "--context",
+        type=int,
+        default=DEFAULT_CONTEXT,
+        help=f"maximum bytes of context around each hit (default: {DEFAULT_CONTEXT})",
+    )
+    args = parser.parse_args(namespace=SearchCLIArguments)
+    try:
+        needle = args.needle.encode("big5web")
+    except UnicodeEncodeError as err:
+        parser.error(f"can't search for {args.needle!r}: {err}")
+    found = False
+    for path in args.files:
+        prefix = f"{path}:" if len(args.files) > 1 else ""
+        count = 0
+        try:
+            context = 0 if args.count else args.context
+            for hit in search_file(path, needle, context=context):
+                count += 1
+                if not args.count:
+                    print(f"{prefix}{hit.offset}: {hit.context}")
+        except OSError as err:
+            print(err, file=sys.stderr)
+            continue
+        if args.count:
+            print(f"{prefix}{count}")
+        found = found or count > 0
+    sys.exit(0 if found else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,33 @@
+import json
+from pathlib import Path
+import sys
+import pytest
+
+from big5web import benchmark
+
+
+@pytest.mark.parametrize("corpus", benchmark.CORPORA)
+def test_make_corpus(corpus: str):
+    data = benchmark.make_corpus(corpus, 1000)
+    assert len(data) >= 1000
+    assert data == benchmark.make_corpus(corpus, 1000)
+    if corpus == "corrupted":
+        with pytest.raises(UnicodeDecodeError):
+            data.decode("big5web")
+    else:
+        data.decode("big5web")
+
+
+def test_benchmark_main(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    output = tmp_path / "results.json"
+    args = ["--codecs", "big5web", "big5", "--corpora", "hanzi", "--sizes", "1000"]
+    args += ["--repeat", "1", "--no-memory", "-o", str(output)]
+    monkeypatch.setattr(sys, "argv", ["benchmark", *args])
+    benchmark.main()
+    report = json.loads(output.read_text())
+    benchmarks = {(r["benchmark"], r["codec"]) for r in report["results"]}
+    assert benchmarks == {
+        (benchmark, codec)
+        for benchmark in ("import", "decode", "encode")
+        for codec in ("big5web", "big5")
+    }
@@ -1,8 +1,12 @@
-from html.parser import HTMLParser
+from array import array
+import codecs
+import io
+import mmap
 from pathlib import Path
 import pytest
 
-import big5web as _
+import big5web
+from big5web.wpt import WPT_SHARDS, WptDecodeTestParser, errors_for, load_cases
 
 
 @pytest.mark.parametrize(
@@ -11,6 +15,12 @@ import big5web as _
         (b"", ""),
         (b"hello world!", "hello world!"),
         (b"hello \xa5\x40\xac\xc9!", "hello 世界!"),
+        (b"\x88\x62\x88\x64", "\u00CA\u0304\u00CA\u030C"),
+        (b"\x88\xa3\x88\xa5", "\u00EA\u0304\u00EA\u030C"),
+        (b"\xa5\x40abc\xac\xc9\xa5\x40", "世abc界世"),
+        (b"\xa5\x40\x88\x62\xa5\x40", "世\u00CA\u0304世"),
+        # Pairs with leads like the surrogates of UTF-16
+        (b"\xd8\x40\xdc\x40\xdb\x40\xdf\x40", "釫軹罦稛"),
     ],
 )
 def test_big5web_decode_good(encoded: bytes, expected: str):
@@ -34,50 +44,293 @@ def test_big5web_decode_error(encoded: bytes, error: str, instead: str):
     assert encoded.decode("big5web", "ignore") == instead
 
 
-class WptDecodeTestParser(HTMLParser):
-    def __init__(self):
-        super().__init__()
-        self.in_span = False
-        self.span_attrs = None
-        self.span_data = None
-        self.data: list[tuple[str, bytes, str]] = []
-
-    def _parse_attrs(self, attrs):
-        # <span data-cp="25B" data-bytes="C8 F7">
-        codepoint = None
-        undecoded = None
-        for attr, value in attrs:
-            if attr == "data-cp":
-                codepoint = chr(int(value, 16))
-            elif attr == "data-bytes":
-                undecoded = bytes.fromhex(value)
-        assert codepoint is not None
-        assert undecoded is not None
-        return codepoint, undecoded
-
-    def handle_starttag(self, tag, attrs):
-        if tag == "span":
-            assert not self.in_span, "wpt test file is not as expected"
-            self.in_span = True
-            self.span_attrs = self._parse_attrs(attrs)
-            self.span_data = []
-
-    def handle_endtag(self, tag):
-        if self.in_span:
-            assert tag == "span", "wpt test file is not as expected"
-            assert self.span_data is not None
-            assert self.span_attrs is not None
-            decoded = "".join(self.span_data)
-            codepoint, undecoded = self.span_attrs
-            self.data.append((codepoint, undecoded, decoded))
-            self.in_span = False
-            self.span_data = None
-            self.span_attrs = None
-
-    def handle_data(self, data):
-        if self.in_span:
-            assert self.span_data is not None
-            self.span_data.append(data)
+@pytest.mark.parametrize(
+    ("encoded", "start", "end", "replaced"),
+    [
+        (b"aaa\x81", 3, 4, "aaa\ufffd"),
+        (b"a\x80b", 1, 2, "a\ufffdb"),
+        # the error is reported on the trail byte, which is then read again if ASCII
+        (b"\xa5\x40\x81b", 3, 4, "世\ufffdb"),
+        (b"\xa5\x40\x81\xa0b", 3, 4, "世\ufffdb"),
+        # valid trail byte, but the pointer is not in the index
+        (b"\x81\x40\xa5\x40", 1, 2, "\ufffd@世"),
+    ],
+)
+def test_big5web_decode_error_position(
+    encoded: bytes, start: int, end: int, replaced: str
+):
+    with pytest.raises(UnicodeDecodeError) as exc_info:
+        encoded.decode("big5web")
+    assert (exc_info.value.start, exc_info.value.end) == (start, end)
+    assert encoded.decode("big5web", "replace") == replaced
+
+
+@pytest.mark.parametrize(
+    ("decoded", "expected"),
+    [
+        ("", b""),
+        ("hello world!", b"hello world!"),
+        ("hello 世界!", b"hello \xa5\x40\xac\xc9!"),
+        # last pointer wins for these
+        ("\u2550\u5341", b"\xf9\xf9\xa4\x51"),
+        # first pointer wins for anything else
+        ("\u3003\u256d", b"\xa1\xb2\xa2\x7e"),
+    ],
+)
+def test_big5web_encode_good(decoded: str, expected: bytes):
+    assert decoded.encode("big5web") == expected
+
+
+@pytest.mark.parametrize(
+    ("decoded", "start", "end", "replaced"),
+    [
+        ("a\u00e9b", 1, 2, b"a?b"),
+        ("a\u00e9\u00e9b", 1, 3, b"a??b"),
+        # HKSCS pointers are excluded from the encoder
+        ("\u43f0\u4e16", 0, 1, b"?\xa5\x40"),
+        ("\u00ca\u0304", 0, 2, b"??"),
+    ],
+)
+def test_big5web_encode_error(decoded: str, start: int, end: int, replaced: bytes):
+    with pytest.raises(UnicodeEncodeError) as exc_info:
+        decoded.encode("big5web")
+    assert (exc_info.value.start, exc_info.value.end) == (start, end)
+    assert decoded.encode("big5web", "replace") == replaced
+
+
+def test_big5web_incremental_encoder():
+    encoder = codecs.getincrementalencoder("big5web")("replace")
+    encoded = b"".join(encoder.encode(c) for c in "hello \u00e9世界!")
+    assert encoded == b"hello ?\xa5\x40\xac\xc9!"
+
+
+@pytest.mark.parametrize(
+    "errors", ["strict", "replace", "ignore", "backslashreplace", "surrogateescape"]
+)
+@pytest.mark.parametrize(
+    "encoded",
+    [b"aaa\x81", b"a\x80b\xff", b"\xa5\x40\x81b\x81\xa0", bytearray(b"\x81\x40\xfe")],
+)
+def test_big5web_decode_fast_error_handlers(encoded: bytes, errors: str):
+    # same result as the generic path, which is used for any other handler
+    handler = codecs.lookup_error(errors)
+    codecs.register_error(f"test-{errors}", handler)
+
+    def decode(errors: str):
+        try:
+            return encoded.decode("big5web", errors)
+        except UnicodeDecodeError as exc:
+            return (exc.start, exc.end, exc.reason)
+
+    assert decode(errors) == decode(f"test-{errors}")
+
+
+@pytest.mark.parametrize(
+    "encoded",
+    [
+        b"",
+        b"hello \xa5\x40\xac\xc9",
+        b"aaa\x81",
+        b"a\x80b\xff",
+        b"\xa5\x40\x81b\x81\xa0",
+        b"\x81\x40\xfe",
+        b"\x88\x62\x88\x64\xa1\x40\xc8\x7e\xc8\xa0\xfe\xfe",
+    ],
+)
+def test_big5web_find_errors(encoded: bytes):
+    recorded: list[tuple[int, str]] = []
+
+    def record(exc: UnicodeError):
+        assert isinstance(exc, UnicodeDecodeError)
+        recorded.append((exc.start, exc.reason))
+        return ("", exc.end)
+
+    codecs.register_error("test-record", record)
+    encoded.decode("big5web", "test-record")
+    assert big5web.find_errors(encoded) == recorded
+    assert big5web.find_errors(bytearray(encoded), limit=1) == recorded[:1]
+    assert big5web.validate(encoded) == (not recorded)
+
+
+def test_big5web_find_errors_window():
+    data = b"\xff\xa5\x40\x81"
+    assert big5web.find_errors(data) == [
+        (0, "invalid start byte"),
+        (3, "incomplete multibyte sequence"),
+    ]
+    assert big5web.find_errors(data, start=1) == [(2, "incomplete multibyte sequence")]
+    assert big5web.validate(data, start=1, end=3)
+
+
+@pytest.mark.parametrize(
+    ("errors", "expected"),
+    [
+        ("replace", [0, 1, 2, 4, 4, 6, 9, 9, 10, 11, 12, 14]),
+        (
+            "backslashreplace",
+            [0, 1, 2, 4, 4, 6, *[9] * 4, 9, *[10] * 4, *[11] * 4, 12, 14],
+        ),
+        # skips the byte in error and the next one, with a two-character replacement
+        ("test-skip", [0, 1, 2, 4, 4, 6, 9, 9, 10, 10, 12, 14]),
+    ],
+)
+def test_big5web_decode_with_offsets(errors: str, expected: "list[int]"):
+    codecs.register_error("test-skip", lambda exc: ("??", exc.end + 1))  # type: ignore
+    encoded = b"ab\xa5\x40\x88\x62\xa5\x40\x81c\xff\xff\xac\xc9!"
+    text, offsets = big5web.decode_with_offsets(encoded, errors)
+    assert text == encoded.decode("big5web", errors)
+    assert [*offsets] == offsets[:] == offsets.to_array().tolist() == expected
+
+
+def test_big5web_decode_with_offsets_window():
+    text, offsets = big5web.decode_with_offsets(b"xx\xa5\x40ab\xac\xc9", start=2)
+    assert text == "\u4e16ab\u754c"
+    assert [*offsets] == [0, 2, 3, 4]
+    assert offsets.to_array().typecode == "I"
+    text, offsets = big5web.decode_with_offsets(b"")
+    assert text == "" and len(offsets) == 0 and len(offsets.to_array()) == 0
+    with pytest.raises(IndexError):
+        offsets[0]
+
+
+DECODE_MANY_INPUTS = [
+    b"Chan Tai Man",
+    b"\xb3\xaf\xa4\x6a\xa4\xe5",
+    b"",
+    b"a\xff\xa5\x40",
+    bytearray(b"\xa5\x40\x81"),
+    b"\x81",
+    b"\xa5\x40",
+]
+
+
+@pytest.mark.parametrize("errors", ["replace", "backslashreplace", "ignore"])
+@pytest.mark.parametrize("separator", [None, b"\x00", b"\n"])
+def test_big5web_decode_many(errors: str, separator: "bytes | None"):
+    expected = [bytes(input).decode("big5web", errors) for input in DECODE_MANY_INPUTS]
+    decoded = big5web.decode_many(DECODE_MANY_INPUTS, errors, separator=separator)
+    assert decoded == expected
+    assert big5web.decode_many([], errors, separator=separator) == []
+
+
+def test_big5web_decode_many_errors():
+    with pytest.raises(UnicodeDecodeError) as exc_info:
+        big5web.decode_many(DECODE_MANY_INPUTS, separator=b"\x00")
+    # the error is reported for the input alone
+    assert exc_info.value.object == b"a\xff\xa5\x40"
+    with pytest.raises(ValueError):
+        big5web.decode_many([b"a\nb"], separator=b"\n")
+    with pytest.raises(ValueError):
+        big5web.decode_many([b"ab"], separator=b"@")
+
+
+def test_big5web_decode_many_workers():
+    inputs = [bytes(input) for input in DECODE_MANY_INPUTS] * 10
+    expected = [input.decode("big5web", "replace") for input in inputs]
+    decoded = big5web.decode_many(inputs, "replace", workers=2, batch_size=3)
+    assert decoded == expected
+
+
+def test_big5web_decode_buffers(tmp_path: Path):
+    encoded = b"xx hello \xa5\x40\xac\xc9!\xff"
+    assert big5web.decode(bytearray(encoded), start=3, end=-1) == ("hello 世界!", 11)
+    words = array("H")
+    words.frombytes(b"\xa5\x40AA")
+    assert big5web.decode(words) == ("世AA", 4)
+    path = tmp_path / "big5.txt"
+    path.write_bytes(encoded)
+    with open(path, "rb") as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        assert big5web.decode(memoryview(mm)[3:-1]) == ("hello 世界!", 11)
+        with pytest.raises(UnicodeDecodeError) as exc_info:
+            big5web.decode(mm, start=3)
+        # positions are relative to the window, and only the window is copied
+        assert exc_info.value.start == 11
+        assert exc_info.value.object == encoded[3:]
+        # the mmap is not in use anymore
+        mm.close()
+
+
+def test_big5web_incremental_decoder():
+    decoder = codecs.getincrementaldecoder("big5web")()
+    assert decoder.decode(b"hello \xa5") == "hello "
+    assert decoder.getstate() == (b"\xa5", 0)
+    assert decoder.decode(b"\x40\xac") == "世"
+    state = decoder.getstate()
+    assert decoder.decode(b"\xc9!", final=True) == "界!"
+    decoder.setstate(state)
+    assert decoder.decode(b"\xc9") == "界"
+    assert decoder.decode(b"\xac") == ""
+    with pytest.raises(UnicodeDecodeError, match="incomplete multibyte sequence"):
+        decoder.decode(b"", final=True)
+
+
+def test_big5web_incremental_decoder_errors():
+    decoder = codecs.getincrementaldecoder("big5web")("replace")
+    # the trail byte is read again as ASCII
+    assert decoder.decode(b"\x81") == ""
+    assert decoder.decode(b"a\x81") == "\ufffda"
+    assert decoder.decode(b"", final=True) == "\ufffd"
+    assert decoder.getstate() == (b"", 0)
+
+
+def test_big5web_text_io(tmp_path: Path):
+    encoded = b"hello \xa5\x40\xac\xc9!\n" * 1000
+    path = tmp_path / "big5.txt"
+    path.write_bytes(encoded)
+    with open(path, encoding="big5web") as f:
+        f._CHUNK_SIZE = 7  # type: ignore
+        assert f.readline() == "hello 世界!\n"
+        position = f.tell()
+        assert f.read() == "hello 世界!\n" * 999
+        f.seek(position)
+        assert f.readline() == "hello 世界!\n"
+
+
+def test_big5web_stream_reader():
+    encoded = b"hello \xa5\x40\n\xac\xc9!\r\nbye"
+    reader = codecs.getreader("big5web")(io.BytesIO(encoded), chunk_size=3)
+    assert list(reader) == ["hello 世\n", "界!\r\n", "bye"]
+    reader = codecs.getreader("big5web")(io.BytesIO(encoded))
+    assert reader.read(7) == "hello 世"
+    assert reader.read() == "\n界!\r\nbye"
+    reader = codecs.getreader("big5web")(io.BytesIO(b"hello \xa5"))
+    with pytest.raises(UnicodeDecodeError, match="incomplete multibyte sequence"):
+        reader.read()
+
+
+def test_big5web_codecs_open(tmp_path: Path):
+    path = tmp_path / "big5.txt"
+    with codecs.open(str(path), "w", encoding="big5web") as f:
+        f.write("hello 世界!\n" * 1000)
+    assert path.read_bytes() == b"hello \xa5\x40\xac\xc9!\n" * 1000
+    with codecs.open(str(path), encoding="big5web") as f:
+        assert sum(1 for _ in f) == 1000
+
+
+def test_big5_index():
+    index = big5web.BIG5_INDEX
+    assert isinstance(index, big5web.Big5Index)
+    assert dict(index) == big5web.load_big5_index()
+    assert index[942] == "\u43f0"
+    assert 942 in index and 0 not in index and "942" not in index
+    assert index.get(0) is None and index.get(-1) is None
+    assert index.code_points[942] == 0x43F0
+    assert index.code_points.readonly
+
+
+def test_compiled_index(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    compiled_path = tmp_path / "index-big5.bin"
+    monkeypatch.setattr(big5web, "COMPILED_INDEX_PATH", compiled_path)
+    expected = big5web.compile_big5_index(big5web.load_big5_index())
+    assert big5web.load_compiled_big5_index() == expected
+    assert compiled_path.exists()
+    # loaded from the cache
+    assert big5web.load_compiled_big5_index() == expected
+    # stale cache is replaced
+    compiled_path.write_bytes(b"big5web 0000\n" + compiled_path.read_bytes()[-100:])
+    assert big5web.load_compiled_big5_index() == expected
+    assert big5web.load_compiled_big5_index() == expected
 
 
 def test_WptDecodeTestParser():
@@ -95,6 +348,11 @@ def test_WptDecodeTestParser():
     assert len(parser.data) == 1
     assert parser.data[0] == ("\u025b", b"\xC8\xF7", "\u025b")
 
+    # as in the generated files
+    parser = WptDecodeTestParser()
+    parser.feed('<span data-cp="CA 304" data-bytes="88 62">\u00ca\u0304</span>')
+    assert parser.data == [("\u00ca\u0304", b"\x88\x62", "\u00ca\u0304")]
+
     parser = WptDecodeTestParser()
     parser.feed(
         """
@@ -130,17 +388,17 @@ def test_WptDecodeTestParser():
 
 
 class TestWptDecode:
-    """Tests based on web-platform-tests"""
+    """Tests based on web-platform-tests, or on files generated like them"""
 
     def test_wpt_decode_stream(self, wpt_path: Path):
         """Test that the IO can use the decoder"""
-        wpt_path.read_text("big5web")
+        wpt_path.read_text("big5web", errors_for(wpt_path))
 
     def test_wpt_decode_file(self, wpt_decoded: str):
         """Test that the resource is decoded with no errors"""
         pass
 
-    def test_wpt_parse(self, wpt_decoded: str):
+    def test_wpt_parse(self, wpt_path: Path, wpt_decoded: str):
         """Test that the resource can be parsed as HTML"""
 
         parser = WptDecodeTestParser()
@@ -149,4 +407,13 @@ class TestWptDecode:
 
         for codepoint, undecoded, decoded in parser.data:
             assert codepoint == decoded
-            assert undecoded.decode("big5web") == decoded
+            assert undecoded.decode("big5web", errors_for(wpt_path)) == decoded
+
+    def test_wpt_cases(self, wpt_shard: "tuple[Path, int]"):
+        """Test each span on its own, in shards that can run in parallel"""
+        path, shard = wpt_shard
+        errors = errors_for(path)
+        cases = load_cases(path)[shard::WPT_SHARDS]
+        assert cases
+        for expected, undecoded in cases:
+            assert undecoded.decode("big5web", errors) == expected
@@ -0,0 +1,55 @@
+from pathlib import Path
+import pytest
+
+from big5web.checkpoints import SIDECAR_SUFFIX, CheckpointedFile, build_checkpoints
+
+ENCODED = b"".join(
+    b"%d hello \xa5\x40\xac\xc9!\x81\n" % i + b"\x88\x62" * (i % 5) for i in range(100)
+)
+TEXT = ENCODED.decode("big5web", "replace")
+LINES = TEXT.split("\n")
+
+
+def test_build_checkpoints():
+    checkpoints = build_checkpoints(ENCODED, interval=50)
+    assert len(checkpoints) > 3 * 10
+    assert checkpoints[:3].tolist() == [0, 0, 0]
+    assert checkpoints[-3:].tolist() == [len(ENCODED), len(TEXT), len(LINES) - 1]
+    for byte, chars, newlines in zip(*[iter(checkpoints)] * 3):
+        before = ENCODED[:byte].decode("big5web", "replace")
+        assert (len(before), before.count("\n")) == (chars, newlines)
+
+
+@pytest.mark.parametrize("interval", [1, 50, 100000])
+def test_checkpointed_file(tmp_path: Path, interval: int):
+    path = tmp_path / "big5.txt"
+    path.write_bytes(ENCODED)
+    with CheckpointedFile(str(path), interval=interval) as f:
+        assert (f.char_count, f.line_count) == (len(TEXT), len(LINES))
+        assert f.read_chars(0, len(TEXT)) == TEXT
+        assert f.read_chars(1000, 1010) == TEXT[1000:1010]
+        assert f.read_chars(5, 5) == ""
+        assert f.read_lines(0, 1) == LINES[0] + "\n"
+        assert f.read_lines(42, 45) == "".join(line + "\n" for line in LINES[42:45])
+        # the last line doesn't end with a newline
+        assert f.read_lines(99, 200) == LINES[99] + "\n" + LINES[100]
+        assert f.read_lines(200, 300) == ""
+    assert (tmp_path / ("big5.txt" + SIDECAR_SUFFIX)).exists()
+
+
+def test_checkpointed_file_sidecar(tmp_path: Path):
+    path = tmp_path / "big5.txt"
+    sidecar = tmp_path / "checkpoints"
+    path.write_bytes(ENCODED)
+    CheckpointedFile(str(path), sidecar_path=str(sidecar), interval=50).close()
+    saved = sidecar.read_bytes()
+    # the saved checkpoints are used, whatever the interval
+    with CheckpointedFile(str(path), sidecar_path=str(sidecar)) as f:
+        assert f.read_lines(10, 11) == LINES[10] + "\n"
+    assert sidecar.read_bytes() == saved
+    # but not with another error handler, or if the file changes
+    with CheckpointedFile(str(path), "ignore", sidecar_path=str(sidecar)) as f:
+        assert f.char_count == len(ENCODED.decode("big5web", "ignore"))
+    path.write_bytes(b"")
+    with CheckpointedFile(str(path), sidecar_path=str(sidecar)) as f:
+        assert (f.char_count, f.line_count, f.read_lines(0, 1)) == (0, 0, "")
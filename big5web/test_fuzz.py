@@ -0,0 +1,55 @@
+import pytest
+
+import big5web
+from big5web.fuzz import check, fuzz, reference_decode
+
+
+@pytest.mark.parametrize(
+    "encoded, expected",
+    [
+        (b"a\xa5\x40b", ("a世b", 4, [])),
+        (b"\x88\x62", ("Ê̄", 2, [])),
+        (
+            b"\x80\xa5\xff",
+            ("��", 3, [(0, "invalid start byte"), (2, "illegal multibyte sequence")]),
+        ),
+        # the ASCII byte after an invalid lead is decoded again
+        (b"\x81\x40", ("�@", 2, [(1, "illegal multibyte sequence")])),
+        (b"a\xa5", ("a�", 2, [(1, "incomplete multibyte sequence")])),
+    ],
+)
+def test_reference_decode(
+    encoded: bytes, expected: "tuple[str, int, list[tuple[int, str]]]"
+):
+    assert reference_decode(encoded) == expected
+
+
+def test_reference_decode_not_final():
+    assert reference_decode(b"a\xa5", final=False) == ("a", 1, [])
+
+
+def test_reference_decode_reads_the_text_index(monkeypatch: pytest.MonkeyPatch):
+    # The compiled index is under test, so the reference doesn't use it
+    monkeypatch.setattr(big5web, "BIG5_INDEX", {})
+    assert reference_decode(b"\xa5\x40") == ("世", 2, [])
+
+
+def test_fuzz():
+    report = fuzz(500, seed=1)
+    assert report.failures == []
+    assert report.inputs == 500
+    assert report.inputs_per_second > 0
+
+
+def test_check_finds_differences(monkeypatch: pytest.MonkeyPatch):
+    # A decoder which forgets the prepend rule
+    decode = big5web.decode
+
+    def broken_decode(input: bytes, errors: str = "strict", final: bool = True):
+        text, consumed = decode(input, errors, final)
+        return text.replace("�@", "�"), consumed
+
+    monkeypatch.setattr(big5web, "decode", broken_decode)
+    problems = check(b"\x81@", [b"\x81", b"@"])
+    assert any(problem.startswith("replace:") for problem in problems)
+    assert any(problem.startswith("incremental") for problem in problems)
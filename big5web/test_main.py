@@ -0,0 +1,87 @@
+import io
+from pathlib import Path
+import sys
+import pytest
+
+from big5web.__main__ import MainCLIArguments, Transcoder, main
+from big5web.parallel import ChunkDecodeError
+
+ENCODED = b"hello \xa5\x40\xac\xc9!\n" * 10 + b"\xff\xa5\x40\x81"
+
+
+@pytest.fixture(autouse=True)
+def cli_arguments(monkeypatch: pytest.MonkeyPatch):
+    # Arguments are parsed into the class, and the defaults only set if missing
+    for name in MainCLIArguments.__annotations__:
+        monkeypatch.delattr(MainCLIArguments, name, raising=False)
+
+
+@pytest.mark.parametrize("buffer_size", [1, 7, 1000])
+def test_transcoder(buffer_size: int):
+    out = io.BytesIO()
+    transcoder = Transcoder(out, "replace")
+    transcoder.transcode(io.BytesIO(ENCODED), buffer_size)
+    assert out.getvalue() == ENCODED.decode("big5web", "replace").encode("utf-8")
+    assert (transcoder.bytes_read, transcoder.error_count) == (len(ENCODED), 2)
+
+
+def test_transcoders_count_their_own_errors():
+    first = Transcoder(io.BytesIO(), "replace")
+    second = Transcoder(io.BytesIO(), "ignore")
+    first.transcode(io.BytesIO(ENCODED))
+    second.transcode(io.BytesIO(ENCODED))
+    first.transcode(io.BytesIO(b"\xff"))
+    assert (first.error_count, second.error_count) == (3, 2)
+
+
+def test_transcoder_strict():
+    transcoder = Transcoder(io.BytesIO())
+    with pytest.raises(ChunkDecodeError) as exc_info:
+        transcoder.transcode(io.BytesIO(ENCODED), 7)
+    exc = exc_info.value
+    assert exc.offset + exc.start == len(ENCODED) - 4
+
+
+def test_transcoder_surrogateescape():
+    out = io.BytesIO()
+    Transcoder(out, "surrogateescape").transcode(io.BytesIO(b"a\xff\xa5\x40"))
+    assert out.getvalue() == b"a\xff" + "世".encode("utf-8")
+
+
+@pytest.mark.parametrize("workers", [[], ["-j", "2"]])
+def test_main(
+    tmp_path: Path,
+    monkeypatch: pytest.MonkeyPatch,
+    capsys: pytest.CaptureFixture[str],
+    workers: "list[str]",
+):
+    path = tmp_path / "big5.txt"
+    path.write_bytes(ENCODED)
+    output = tmp_path / "utf8.txt"
+    args = [str(path), str(path), "-o", str(output), "-e", "replace", *workers]
+    monkeypatch.setattr(sys, "argv", ["big5web", *args])
+    main()
+    expected = ENCODED.decode("big5web", "replace").encode("utf-8")
+    assert output.read_bytes() == expected * 2
+    err = capsys.readouterr().err
+    assert f"{2 * len(ENCODED)} bytes" in err
+    assert "4 error(s)" in err
+
+
+def test_main_error_offset(
+    tmp_path: Path,
+    monkeypatch: pytest.MonkeyPatch,
+    capsys: pytest.CaptureFixture[str],
+):
+    first = tmp_path / "first.txt"
+    first.write_bytes(b"hello \xa5\x40\n")
+    second = tmp_path / "second.txt"
+    second.write_bytes(b"abc\xff")
+    output = tmp_path / "utf8.txt"
+    args = [str(first), str(second), "-o", str(output)]
+    monkeypatch.setattr(sys, "argv", ["big5web", *args])
+    with pytest.raises(SystemExit):
+        main()
+    # The offset is in the file with the error
+    err = capsys.readouterr().err
+    assert err.startswith(f"{second}: ") and "(at offset 3 of the input)" in err
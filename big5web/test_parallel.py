@@ -0,0 +1,49 @@
+from pathlib import Path
+import pytest
+
+from big5web.parallel import (
+    ChunkDecodeError,
+    decode_parallel,
+    iter_decode,
+    split_points,
+)
+
+ENCODED = b"hello \xa5\x40\xac\xc9!\n\x81\xa0\n\xa5\x40\xac\xc9\xa5\x40" * 20
+
+
+def test_split_points():
+    points = split_points(ENCODED, 5)
+    assert points[0] == 0
+    assert points[-1] == len(ENCODED)
+    for point in points[1:-1]:
+        assert ENCODED[point - 1] < 0x40
+    # no split points at all
+    assert split_points(b"\xa5\x40" * 10, 5) == [0, 20]
+    assert split_points(b"", 5) == [0, 0]
+
+
+@pytest.mark.parametrize("errors", ["replace", "ignore", "backslashreplace"])
+def test_decode_parallel(errors: str):
+    expected = ENCODED.decode("big5web", errors)
+    assert decode_parallel(ENCODED, errors, workers=2, chunk_size=7) == expected
+
+
+def test_decode_parallel_file(tmp_path: Path):
+    path = tmp_path / "big5.txt"
+    path.write_bytes(ENCODED)
+    chunks = [*iter_decode(path, "replace", workers=2, chunk_size=50)]
+    decoded = "".join(chunk.text for chunk in chunks)
+    assert decoded == ENCODED.decode("big5web", "replace")
+    errors = [error for chunk in chunks for error in chunk.errors]
+    assert errors == [
+        (offset + 13, "illegal multibyte sequence")
+        for offset in range(0, len(ENCODED), len(ENCODED) // 20)
+    ]
+
+
+def test_decode_parallel_strict():
+    with pytest.raises(ChunkDecodeError) as exc_info:
+        decode_parallel(b"hello\n" * 10 + b"\xff", workers=2, chunk_size=7)
+    exc = exc_info.value
+    assert exc.offset + exc.start == 60
+    assert exc.object[exc.start : exc.end] == b"\xff"
@@ -0,0 +1,44 @@
+from pathlib import Path
+import pytest
+
+from big5web.search import is_boundary, search, search_file
+
+# "\xa4\x40" is 一, and "@" is 0x40: the "@" in it is not a hit
+ENCODED = b"ab\xa4@xx\n\xa5\x40@\r\nyy\x81@ \xa4\x40\xa5\x40@"
+
+
+def test_is_boundary():
+    boundaries = [0, 1, 2, 4, 5, 6, 7, 9, 10, 11, 12, 13, 14, 15, 16, 17, 19, 21, 22]
+    assert [p for p in range(len(ENCODED) + 1) if is_boundary(ENCODED, p)] == boundaries
+    # decoding from a boundary after a lead byte
+    assert is_boundary(b"\xa4\xa4\x40", 2, start=1) is False
+    assert is_boundary(b"\xa4\xa4\x40", 1, start=1) is True
+
+
+def test_search():
+    hits = [*search(ENCODED, "@")]
+    # the error after \x81 is skipped, and then the "@" is decoded as ASCII
+    assert [hit.offset for hit in hits] == [9, 15, 21]
+    assert [hit.context for hit in hits] == ["世@", "yy�@ 一世@", "yy�@ 一世@"]
+    assert [hit.offset for hit in search(ENCODED, b"\xa5\x40@")] == [7, 19]
+    assert [*search(ENCODED, "世", context=0)] == [(7, ""), (19, "")]
+
+
+def test_search_context():
+    encoded = b"0123456789" * 3 + b"\xa5\x40" * 20 + b"abc"
+    (hit,) = search(encoded, "abc", context=10)
+    # no byte below 0x40 within the context before the hit
+    assert hit.context == "abc"
+    hit = next(search(encoded, "世世世", context=10))
+    assert hit.context == "123456789" + "世" * 8
+
+
+def test_search_file(tmp_path: Path):
+    path = tmp_path / "big5.txt"
+    path.write_bytes(ENCODED * 1000)
+    hits = [*search_file(str(path), "世@")]
+    assert len(hits) == 2000
+    (tmp_path / "empty.txt").write_bytes(b"")
+    assert [*search_file(str(tmp_path / "empty.txt"), "世")] == []
+    with pytest.raises(UnicodeEncodeError):
+        next(search_file(str(path), "é"))
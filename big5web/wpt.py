@@ -0,0 +1,181 @@
+"""Test files like the big5 ones in web-platform-tests, generated from index-big5.txt.
+
+Files like wpt/encoding/legacy-mb-tchinese/big5/big5_chars.html are HTML encoded
+as Big5, with a span for each character, like:
+
+  <span data-cp="25B" data-bytes="C8 F7">...</span>
+
+where ... are the bytes. The generated files use the same format, so that the same
+tests run without a checkout of web-platform-tests:
+
+- big5_chars_generated.html has every pointer in the index, and the pointers that
+  decode to two characters (with two code points in data-cp).
+- big5_errors_generated.html has byte sequences that are errors, with the expected
+  result of decoding them with replacement characters (U+FFFD), which is what
+  browsers do. Files with "errors" in the name are decoded with errors="replace".
+"""
+import functools
+from html.parser import HTMLParser
+import os
+from pathlib import Path
+import re
+from typing import Iterator
+
+from . import DOUBLE_CHAR_TABLE, LEAD_BYTES, bytes_for, load_big5_index
+
+CHARS_FILE_NAME = "big5_chars_generated.html"
+ERRORS_FILE_NAME = "big5_errors_generated.html"
+
+# Number of parts in which the spans of each file are tested, so that pytest-xdist
+# can spread them over its workers
+WPT_SHARDS = 8
+
+_HEADER = b"""<!doctype html>
+<html>
+<head><meta charset="big5"><title>big5 characters</title></head>
+<body>
+"""
+_FOOTER = b"""</body>
+</html>
+"""
+
+_SPAN = re.compile(rb'<span data-cp="([0-9A-Fa-f ]+)" data-bytes="([0-9A-Fa-f ]+)">')
+
+
+def _span(code_points: "list[int]", undecoded: bytes) -> bytes:
+    cp = " ".join(f"{c:X}" for c in code_points)
+    return (
+        f'<span data-cp="{cp}" data-bytes="{undecoded.hex(" ").upper()}">'.encode()
+        + undecoded
+        + b"</span>\n"
+    )
+
+
+def generate_chars() -> bytes:
+    spans: list[tuple[int, bytes]] = []
+    for pointer, char in load_big5_index().items():
+        spans.append((pointer, _span([ord(char)], bytes_for(pointer))))
+    for pointer, text in DOUBLE_CHAR_TABLE.items():
+        spans.append((pointer, _span([*map(ord, text)], bytes_for(pointer))))
+    return _HEADER + b"".join(span for _, span in sorted(spans)) + _FOOTER
+
+
+def _error_cases() -> "Iterator[tuple[list[int], bytes]]":
+    # If byte is an ASCII byte after a lead byte, it's prepended to the stream, so
+    # it's decoded after the replacement character.
+    def replaced(undecoded: bytes) -> "list[int]":
+        trail = undecoded[1:]
+        return [0xFFFD, *trail] if trail and trail[0] < 0x80 else [0xFFFD]
+
+    # Not lead bytes
+    yield [0xFFFD], b"\x80"
+    yield [0xFFFD], b"\xff"
+    mapped = {*load_big5_index(), *DOUBLE_CHAR_TABLE}
+    for lead in LEAD_BYTES:
+        # Lead byte followed by the "<" of the end tag
+        yield [0xFFFD], bytes((lead,))
+        # Lead byte followed by a byte that can't be a trail byte
+        for byte in [0x30, *range(0x7F, 0xA1), 0xFF]:
+            undecoded = bytes((lead, byte))
+            yield replaced(undecoded), undecoded
+    # Valid trail bytes, but the pointer is not in the index
+    for pointer in range(len(LEAD_BYTES) * 157):
+        if pointer not in mapped:
+            undecoded = bytes_for(pointer)
+            yield replaced(undecoded), undecoded
+
+
+def generate_errors() -> bytes:
+    spans = [_span(code_points, undecoded) for code_points, undecoded in _error_cases()]
+    return _HEADER + b"".join(spans) + _FOOTER
+
+
+def write_fixtures(directory: Path) -> "list[Path]":
+    """Write the generated files to directory, if they are missing or changed.
+
+    Files are replaced atomically, so that concurrent test runs (like pytest-xdist
+    workers) can all call this.
+    """
+    paths: list[Path] = []
+    for name, generate in [
+        (CHARS_FILE_NAME, generate_chars),
+        (ERRORS_FILE_NAME, generate_errors),
+    ]:
+        path = directory / name
+        content = generate()
+        try:
+            up_to_date = path.read_bytes() == content
+        except OSError:
+            up_to_date = False
+        if not up_to_date:
+            temp_path = path.with_suffix(f".{os.getpid()}.tmp")
+            temp_path.write_bytes(content)
+            os.replace(temp_path, path)
+        paths.append(path)
+    return paths
+
+
+def errors_for(path: Path) -> str:
+    """Error handler to decode a test file with."""
+    return "replace" if "errors" in path.stem else "strict"
+
+
+@functools.cache
+def load_cases(path: Path) -> "list[tuple[str, bytes]]":
+    """The expected text and the bytes of each span in a test file.
+
+    The attributes are read from the undecoded file, and the result is cached, so
+    that tests can share it.
+    """
+    cases: list[tuple[str, bytes]] = []
+    for cps, undecoded in _SPAN.findall(path.read_bytes()):
+        expected = "".join(chr(int(cp, 16)) for cp in cps.split())
+        cases.append((expected, bytes.fromhex(undecoded.decode("ascii"))))
+    return cases
+
+
+class WptDecodeTestParser(HTMLParser):
+    def __init__(self):
+        super().__init__()
+        self.in_span = False
+        self.span_attrs = None
+        self.span_data = None
+        self.data: list[tuple[str, bytes, str]] = []
+
+    def _parse_attrs(self, attrs):
+        # <span data-cp="25B" data-bytes="C8 F7">
+        codepoint = None
+        undecoded = None
+        for attr, value in attrs:
+            if attr == "data-cp":
+                # More than one code point in generated files
+                codepoint = "".join(chr(int(cp, 16)) for cp in value.split())
+            elif attr == "data-bytes":
+                undecoded = bytes.fromhex(value)
+        assert codepoint is not None
+        assert undecoded is not None
+        return codepoint, undecoded
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "span":
+            assert not self.in_span, "wpt test file is not as expected"
+            self.in_span = True
+            self.span_attrs = self._parse_attrs(attrs)
+            self.span_data = []
+
+    def handle_endtag(self, tag):
+        if self.in_span:
+            assert tag == "span", "wpt test file is not as expected"
+            assert self.span_data is not None
+            assert self.span_attrs is not None
+            decoded = "".join(self.span_data)
+            codepoint, undecoded = self.span_attrs
+            self.data.append((codepoint, undecoded, decoded))
+            self.in_span = False
+            self.span_data = None
+            self.span_attrs = None
+
+    def handle_data(self, data):
+        if self.in_span:
+            assert self.span_data is not None
+            self.span_data.append(data)
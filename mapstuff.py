@@ -1,8 +1,6 @@
 import json
 from pathlib import Path
 
-from genmap_support import *
-
 
 def load_unicode_mappings(search_field: str):
     # https://www.unicode.org/reports/tr38/
@@ -103,8 +101,8 @@ def old_loadhkscsmap(fo):
 
 
 # https://www.ogcio.gov.hk/tc/our_work/business/tech_promotion/ccli/hkscs/doc/HKSCS2016.json
-def load_ccli_json():
-    with open("HKSCS2016.json", "rb") as f:
+def load_ccli_json(path="HKSCS2016.json"):
+    with open(path, "rb") as f:
         data = json.load(f)
     # JSON document is a list of objects like:
     #   {
@@ -124,6 +122,10 @@ def load_ccli_json():
     return table
 
 def main_hkscs():
+    # Only needed to write the C header, so that the loaders above can be imported
+    # without it (genmap_support comes with the CPython sources)
+    from genmap_support import BufferedFiller, DecodeMapWriter, EncodeMapWriter
+
     # raw_table = load_unicode_mappings("kHKSCS")
     # table = {scalar: int(value, 16) for scalar, value in raw_table.items()}
     c1_lower, c1_upper = BIG5HKSCS_C1 = (0x87, 0xfe)
@@ -0,0 +1,157 @@
+import codecs
+import io
+import random
+import pytest
+
+import big5hkscs2016
+from big5hkscs2016 import (
+    COMPOSED_TABLE,
+    LEAD_BYTES,
+    TRAIL_BYTES,
+    IncrementalDecoder,
+    IncrementalEncoder,
+    decode,
+    load_hkscs_table,
+)
+
+ENCODED = b"hello \xa5\x40\xac\xc9!\n\x88\x62\x88\x4e\x88\x66\xc6\xa1"
+TEXT = "hello 世界!\nÊ̄\U000200caÊ\u2460"
+
+
+def decode_pair(pair: bytes, codec: str) -> "str | None":
+    try:
+        return pair.decode(codec)
+    except UnicodeDecodeError:
+        return None
+
+
+def test_decode_table():
+    hkscs = load_hkscs_table()
+    added: list[bytes] = []
+    changed: list[bytes] = []
+    for lead in LEAD_BYTES:
+        for trail in TRAIL_BYTES:
+            pair = bytes((lead, trail))
+            expected = decode_pair(pair, "big5hkscs")
+            actual = decode_pair(pair, "big5hkscs2016")
+            if actual == expected:
+                continue
+            assert actual is not None, pair
+            if expected is None:
+                added.append(pair)
+            else:
+                changed.append(pair)
+    # Only the characters added to HKSCS after 2004, and three which were remapped
+    assert added and all(pair in hkscs for pair in added)
+    assert [pair.hex().upper() for pair in changed] == ["8FA8", "91B5", "9D73"]
+
+
+def test_round_trip():
+    decoded = "".join(
+        text
+        for lead in LEAD_BYTES
+        for trail in TRAIL_BYTES
+        if (text := decode_pair(bytes((lead, trail)), "big5hkscs2016")) is not None
+    )
+    assert any(ord(char) > 0xFFFF for char in decoded)
+    encoded = decoded.encode("big5hkscs2016")
+    assert encoded.decode("big5hkscs2016") == decoded
+    assert ENCODED.decode("big5hkscs2016") == TEXT
+    assert TEXT.encode("big5hkscs2016") == ENCODED
+
+
+@pytest.mark.parametrize("pair, text", COMPOSED_TABLE.items())
+def test_composed(pair: bytes, text: str):
+    assert pair.decode("big5hkscs2016") == text
+    assert f"a{text}b".encode("big5hkscs2016") == b"a" + pair + b"b"
+    # the first character alone has its own pair
+    assert text[0].encode("big5hkscs2016") not in (b"", pair)
+    encoder = IncrementalEncoder()
+    assert encoder.encode("a" + text[0]) == b"a"
+    assert encoder.getstate() == ord(text[0])
+    assert encoder.encode(text[1:]) == pair
+    assert encoder.encode(text[0]) == b""
+    assert encoder.encode("", final=True) == text[0].encode("big5hkscs2016")
+
+
+@pytest.mark.parametrize(
+    "encoded, start, end, reason",
+    [
+        (b"a\x80b", 1, 2, "illegal multibyte sequence"),
+        (b"\xa4\x7f", 0, 1, "illegal multibyte sequence"),
+        (b"\xa4\x40\xa4", 2, 3, "incomplete multibyte sequence"),
+    ],
+)
+def test_decode_errors(encoded: bytes, start: int, end: int, reason: str):
+    with pytest.raises(UnicodeDecodeError) as exc_info:
+        encoded.decode("big5hkscs2016")
+    exc = exc_info.value
+    assert (exc.encoding, exc.start, exc.end, exc.reason) == (
+        "big5hkscs2016",
+        start,
+        end,
+        reason,
+    )
+    for errors in ["replace", "ignore", "backslashreplace"]:
+        assert encoded.decode("big5hkscs2016", errors) == encoded.decode(
+            "big5hkscs", errors
+        )
+
+
+def test_decode_like_tables():
+    # decode() patches big5hkscs, the tables decode on their own
+    added, remapped = big5hkscs2016._overrides()
+    assert len(added) > 60 and len(remapped) == 3
+    pieces = [
+        *(bytes((byte,)) for byte in range(0x100)),
+        *added,
+        *(bytes((lead, trail)) for lead in LEAD_BYTES for trail in [0x40, 0x7F, 0xFE]),
+        *COMPOSED_TABLE,
+        # remapped
+        b"\x8f\xa8",
+        b"\x91\xb5",
+        b"\x9d\x73",
+    ]
+
+    def result(function, data: bytes, errors: str, final: bool):
+        try:
+            return function(data, errors, final)
+        except UnicodeDecodeError as exc:
+            return (exc.encoding, exc.start, exc.end, exc.reason)
+
+    rng = random.Random(2016)
+    for _ in range(2000):
+        data = b"".join(rng.choices(pieces, k=rng.randint(0, 12)))
+        for errors in ["strict", "replace", "backslashreplace", "surrogateescape"]:
+            for final in [True, False]:
+                assert result(decode, data, errors, final) == result(
+                    big5hkscs2016._CODEC.decode, data, errors, final
+                ), data
+
+
+def test_encode_errors():
+    with pytest.raises(UnicodeEncodeError) as exc_info:
+        "a\U0001F600\U0001F600".encode("big5hkscs2016")
+    exc = exc_info.value
+    assert (exc.encoding, exc.start, exc.end) == ("big5hkscs2016", 1, 2)
+    assert "a\U0001F600世".encode("big5hkscs2016", "replace") == b"a?\xa5\x40"
+    assert "\u0304".encode("big5hkscs2016", "xmlcharrefreplace") == b"&#772;"
+
+
+def test_incremental_decoder():
+    for split in range(len(ENCODED) + 1):
+        decoder = IncrementalDecoder()
+        decoded = decoder.decode(ENCODED[:split]) + decoder.decode(ENCODED[split:])
+        assert decoded + decoder.decode(b"", final=True) == TEXT
+    decoder = IncrementalDecoder("replace")
+    assert decoder.decode(b"a\xa5") == "a"
+    assert decoder.getstate() == (b"\xa5", 0)
+    assert decoder.decode(b"", final=True) == "\ufffd"
+
+
+def test_stream():
+    reader = codecs.getreader("big5hkscs2016")(io.BytesIO(ENCODED))
+    assert reader.readlines() == TEXT.splitlines(keepends=True)
+    out = io.BytesIO()
+    codecs.getwriter("big5-hkscs-2016")(out).write(TEXT)
+    assert out.getvalue() == ENCODED
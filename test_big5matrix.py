@@ -0,0 +1,104 @@
+from array import array
+import json
+from pathlib import Path
+import pytest
+
+import big5matrix
+from big5matrix import CODECS, Matrix, index_pair, load_matrix, pair_index, sweep
+
+
+@pytest.fixture(scope="module")
+def matrix() -> Matrix:
+    return big5matrix.build_matrix()
+
+
+def test_pair_index():
+    assert pair_index(0x81, 0x40) == 0
+    assert index_pair(pair_index(0xA1, 0x45)) == b"\xa1\x45"
+    assert index_pair(big5matrix.PAIR_COUNT - 1) == b"\xfe\xfe"
+
+
+def test_sweep():
+    code_points, texts = sweep("big5web")
+    assert code_points[pair_index(0xA4, 0x40)] == ord("一")
+    assert code_points[pair_index(0xA4, 0x7F)] == 0
+    # pairs decoding to two characters
+    assert code_points[pair_index(0x88, 0x62)] == big5matrix.MULTIPLE
+    assert texts[pair_index(0x88, 0x62)] == "Ê̄"
+
+
+def test_differences(matrix: Matrix):
+    differences = [*matrix.differences("big5", "cp950")]
+    assert pair_index(0xA1, 0x45) in differences
+    assert matrix.decoded("big5", pair_index(0xA1, 0x45)) == "•"
+    assert matrix.decoded("cp950", pair_index(0xA1, 0x45)) == "‧"
+    assert [*matrix.differences("big5", "big5")] == []
+    assert pair_index(0x88, 0x62) not in matrix.differences("big5web", "big5hkscs")
+    # pairs decoding to multiple characters are compared by their texts
+    multiple = array("I", [big5matrix.MULTIPLE, big5matrix.MULTIPLE])
+    texts = {"a": {0: "ab", 1: "cd"}, "b": {0: "ab", 1: "ce"}}
+    small = Matrix({"a": multiple, "b": multiple}, texts)
+    assert [*small.differences("a", "b")] == [1]
+
+
+def test_load_matrix(tmp_path: Path, monkeypatch: pytest.MonkeyPatch, matrix: Matrix):
+    builds: list[Matrix] = []
+
+    def build_matrix() -> Matrix:
+        builds.append(matrix)
+        return matrix
+
+    monkeypatch.setattr(big5matrix, "build_matrix", build_matrix)
+    cache_path = tmp_path / "big5matrix.cache"
+    assert load_matrix(cache_path) is matrix
+    assert len(builds) == 1
+    loaded = load_matrix(cache_path)
+    assert len(builds) == 1
+    assert [*loaded.code_points] == CODECS
+    assert loaded.code_points == matrix.code_points
+    assert loaded.texts == matrix.texts
+
+    # the cache is built again if the key doesn't match
+    with open(cache_path, "rb") as f:
+        header = json.loads(f.readline())
+        arrays = f.read()
+    header["key"] = "another key"
+    cache_path.write_bytes(json.dumps(header).encode() + b"\n" + arrays)
+    load_matrix(cache_path)
+    assert len(builds) == 2
+    with open(cache_path, "rb") as f:
+        assert json.loads(f.readline())["key"] == big5matrix._cache_key()
+
+    # or if it's truncated, or if asked to
+    cache_path.write_bytes(cache_path.read_bytes()[:-4])
+    load_matrix(cache_path)
+    assert len(builds) == 3
+    load_matrix(cache_path, rebuild=True)
+    assert len(builds) == 4
+
+    # or if the codecs change
+    monkeypatch.setattr(big5matrix, "CODECS", CODECS[:-1])
+    load_matrix(cache_path)
+    assert len(builds) == 5
+
+
+def test_load_matrix_write_error(
+    tmp_path: Path,
+    monkeypatch: pytest.MonkeyPatch,
+    capsys: pytest.CaptureFixture[str],
+    matrix: Matrix,
+):
+    monkeypatch.setattr(big5matrix, "build_matrix", lambda: matrix)
+    cache_path = tmp_path / "big5matrix.cache"
+    load_matrix(cache_path)
+    cache = cache_path.read_bytes()
+
+    def replace(src: Path, dst: Path):
+        raise OSError("disk full")
+
+    # The cache is replaced in one go, or not at all
+    monkeypatch.setattr(big5matrix.os, "replace", replace)
+    assert load_matrix(cache_path, rebuild=True) is matrix
+    assert "can't write cache: disk full" in capsys.readouterr().err
+    assert cache_path.read_bytes() == cache
+    assert [*tmp_path.iterdir()] == [cache_path]
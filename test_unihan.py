@@ -0,0 +1,344 @@
+from contextlib import closing
+import os
+from pathlib import Path
+import sqlite3
+from typing import Any, Optional
+from zipfile import ZipFile
+import pytest
+
+import unihan
+from unihan import (
+    ScalarSet,
+    UnihanDB,
+    ValueQuery,
+    block_range,
+    build_index,
+    index_path_for,
+    open_index,
+    parse_scalar_query,
+    parse_unihan_bytes,
+    parse_unihan_dir,
+    parse_unihan_zip,
+    query_index,
+    query_unihan,
+    scan_unihan,
+    update_index,
+)
+
+WALRUS = (
+    "(corrupted form of U+5914 夔) a one-legged monster; a walrus, name of a court "
+    "musician in the reign of Emperor Shun (2255 B.C.)"
+)
+
+SCALARS = range(0x4E00, 0x4F00)
+
+# Properties of each file, in order: by scalar, then by field
+FILES = {
+    "Unihan_IRGSources.txt": [
+        (0x3400, "kRSUnicode", "1.4"),
+        (0x3400, "kTotalStrokes", "5"),
+        *((scalar, "kTotalStrokes", str(scalar % 30)) for scalar in SCALARS),
+        (0x20000, "kRSUnicode", "1.2"),
+        (0x20000, "kTotalStrokes", "3"),
+    ],
+    "Unihan_Readings.txt": [
+        (0x3400, "kDefinition", "(same as U+4E18 丘) hillock or mound"),
+        (0x3400, "kMandarin", "qiū"),
+        (0x3401, "kDefinition", "to lick; to taste, a mat, bamboo bark"),
+        (0x456B, "kDefinition", WALRUS),
+        (0x456B, "kMandarin", "kuí"),
+        *((scalar, "kDefinition", f"bamboo {scalar}") for scalar in SCALARS[::2]),
+        (0x20000, "kMandarin", "hē"),
+        (0x2A6DF, "kDefinition", "walrus"),
+    ],
+}
+PROPERTIES = [property for properties in FILES.values() for property in properties]
+
+
+def file_content(name: str) -> bytes:
+    header = f"# {name}\n#\n# Unicode Character Database\n#\n"
+    lines = (f"U+{s:X}\t{field}\t{value}\n" for s, field, value in FILES[name])
+    return (header + "".join(lines) + "# EOF\n").encode("utf-8")
+
+
+@pytest.fixture
+def database(tmp_path: Path) -> Path:
+    path = tmp_path / "Unihan.zip"
+    with ZipFile(path, "w") as zf:
+        for name in FILES:
+            zf.writestr(name, file_content(name))
+    return path
+
+
+@pytest.mark.parametrize(
+    "name, block",
+    [
+        ("CJK Unified Ideographs", (0x4E00, 0x9FFF)),
+        ("cjk_unified_ideographs-extension-a", (0x3400, 0x4DBF)),
+        ("ExtB", (0x20000, 0x2A6DF)),
+        ("Extension J", (0x323B0, 0x3347F)),
+        ("ExtZ", None),
+    ],
+)
+def test_block_range(name: str, block: Optional[tuple[int, int]]):
+    assert block_range(name) == block
+
+
+def test_scalar_queries():
+    assert parse_scalar_query("U+3400..U+4DBF") == (0x3400, 0x4DBF)
+    assert parse_scalar_query("ExtJ") == (0x323B0, 0x3347F)
+    assert parse_scalar_query("䕫") == (0x456B, 0x456B)
+    for query in ["U+4DBF..U+3400", "nothing like a code point"]:
+        with pytest.raises(ValueError):
+            parse_scalar_query(query)
+    scalars = ScalarSet.from_queries(["U+3400..U+3410", "U+3405..U+3420", "ExtJ"])
+    assert scalars.ranges == [(0x3400, 0x3420), (0x323B0, 0x3347F)]
+    assert 0x3420 in scalars and 0x3421 not in scalars and 0x33000 in scalars
+    assert (scalars.first, scalars.last) == (0x3400, 0x3347F)
+
+
+def test_parse_unihan_bytes():
+    data = file_content("Unihan_Readings.txt")
+    properties = FILES["Unihan_Readings.txt"]
+    assert parse_unihan_bytes(data) == properties
+    assert parse_unihan_bytes(data, ["kMandarin"]) == [
+        property for property in properties if property[1] == "kMandarin"
+    ]
+    assert parse_unihan_bytes(data, ["kTotalStrokes"]) == []
+    for first, last in [(0x3400, 0x3400), (0x3401, 0x4E10), (0x4E7F, 0x30000)]:
+        expected = [p for p in properties if first <= p[0] <= last]
+        assert parse_unihan_bytes(data, None, first, last) == expected
+        assert parse_unihan_bytes(data, None, None, last) == [
+            property for property in properties if property[0] <= last
+        ]
+        assert parse_unihan_bytes(data, ["kDefinition"], first, last) == [
+            property for property in expected if property[1] == "kDefinition"
+        ]
+    assert parse_unihan_bytes(data, None, 0x2A6E0) == []
+    assert parse_unihan_bytes(data, None, None, 0x33FF) == []
+
+
+def test_parse_unihan_zip(database: Path, tmp_path: Path):
+    assert [*parse_unihan_zip(database)] == PROPERTIES
+    assert [*parse_unihan_zip(database, ["kMandarin", "kRSUnicode"])] == [
+        p for p in PROPERTIES if p[1] in ("kMandarin", "kRSUnicode")
+    ]
+    # stable: properties of the same scalar are still by file
+    assert [*parse_unihan_zip(database, workers=2)] == sorted(
+        PROPERTIES, key=lambda property: property[0]
+    )
+    directory = tmp_path / "Unihan"
+    with ZipFile(database) as zf:
+        zf.extractall(directory)
+    assert [*parse_unihan_dir(directory)] == PROPERTIES
+
+
+def test_scan_unihan(database: Path, monkeypatch: pytest.MonkeyPatch):
+    query = ScalarSet.from_queries(["U+3401..U+4E01"])
+    expected = [property for property in PROPERTIES if property[0] in query]
+    monkeypatch.setattr(unihan, "_READ_SIZE", 64)
+    # files are only read up to the last scalar
+    content = file_content("Unihan_Readings.txt")
+    data = unihan._read_file(database, False, "Unihan_Readings.txt", 0x4E01)
+    assert content.startswith(data) and len(data) < len(content) // 2
+    assert [*scan_unihan(database, query)] == expected
+    assert [*scan_unihan(database, query, ["kDefinition"])] == [
+        property for property in expected if property[1] == "kDefinition"
+    ]
+    scalars = [0x456B, 0x2A6DF]
+    assert [*scan_unihan(database, scalars)] == [
+        property for property in PROPERTIES if property[0] in scalars
+    ]
+
+
+def test_build_index_in_batches(database: Path, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(unihan, "_BATCH_SIZE", 7)
+    index_path = build_index(database)
+    conn = unihan._connect(index_path, read_only=True)
+    try:
+        assert [*unihan.query_index(conn)] == PROPERTIES
+    finally:
+        conn.close()
+
+
+def query_results(conn: sqlite3.Connection, *query: Any) -> "list[Any]":
+    return [*query_index(conn, *query)]
+
+
+@pytest.mark.parametrize(
+    "query_scalar, query_field",
+    [
+        (None, None),
+        (None, ["kMandarin", "kTotalStrokes"]),
+        (ScalarSet.from_queries(["U+3400", "U+4E10..U+4E20"]), None),
+        (ScalarSet.from_queries(["U+3400..U+20000"]), ["kDefinition"]),
+        (ScalarSet(), None),
+    ],
+)
+def test_query_index(
+    database: Path,
+    query_scalar: Optional[ScalarSet],
+    query_field: Optional[list[str]],
+):
+    expected = [*scan_unihan(database, query_scalar, query_field)]
+    assert expected or query_scalar is not None
+    with closing(open_index(database)) as conn:
+        assert query_results(conn, query_scalar, query_field) == expected
+
+
+@pytest.mark.parametrize(
+    "query_value, scalars",
+    [
+        (ValueQuery("exact", "kuí"), [0x456B]),
+        (ValueQuery("exact", "kui"), []),
+        (ValueQuery("prefix", "bamboo 2"), [*range(0x4E20, 0x4F00, 2)]),
+        (ValueQuery("prefix", "bamboo 2000"), [*range(0x4E20, 0x4E2A, 2)]),
+        (ValueQuery("prefix", ""), [p[0] for p in PROPERTIES]),
+        (ValueQuery("prefix", "\ud7ff"), []),
+        (ValueQuery("regex", r"^to \w+"), [0x3401]),
+        (ValueQuery("regex", r"\d\.\d"), [0x3400, 0x20000]),
+        (ValueQuery("word", "walrus"), [0x456B, 0x2A6DF]),
+        (ValueQuery("word", "WALRUS, monster"), [0x456B]),
+        (ValueQuery("word", "bamboo bark"), [0x3401]),
+        (ValueQuery("word", "bamboo 20000"), [0x4E20]),
+    ],
+)
+def test_query_value(database: Path, query_value: ValueQuery, scalars: list[int]):
+    expected = [*scan_unihan(database, query_value=query_value)]
+    assert [property[0] for property in expected] == scalars
+    assert all(query_value.matches(property[2]) for property in expected)
+    with closing(open_index(database)) as conn:
+        assert query_results(conn, None, None, query_value) == expected
+        # with the other queries
+        for query_scalar, query_field in [
+            (ScalarSet.from_queries(["U+3401..U+4E10"]), None),
+            ([0x2A6DF], None),
+            (None, ["kDefinition"]),
+            (ScalarSet.from_queries(["U+456B", "U+4E20"]), ["kDefinition"]),
+        ]:
+            query = (query_scalar, query_field, query_value)
+            assert query_results(conn, *query) == [*scan_unihan(database, *query)]
+
+
+def test_prefix_query_bounds(database: Path):
+    values = ["\ud7ff", "a\ud7ff", "a\ud7ffb", "a\ue000", f"a{chr(0x10FFFF)}b", "b"]
+    with ZipFile(database, "a") as zf:
+        zf.writestr(
+            "Unihan_OtherFields.txt",
+            "".join(f"U+{0x3400 + i:X}\tkOther\t{v}\n" for i, v in enumerate(values)),
+        )
+    with closing(open_index(database)) as conn:
+        for pattern in ["\ud7ff", "a\ud7ff", "a", f"a{chr(0x10FFFF)}", "a\ue000"]:
+            query_value = ValueQuery("prefix", pattern)
+            expected = [
+                (0x3400 + i, "kOther", value)
+                for i, value in enumerate(values)
+                if value.startswith(pattern)
+            ]
+            assert query_results(conn, None, ["kOther"], query_value) == expected
+
+
+def test_update_index(database: Path, monkeypatch: pytest.MonkeyPatch):
+    builds: list[Path] = []
+
+    def counted_build_index(path: Path, index_path: Optional[Path] = None) -> Path:
+        builds.append(path)
+        return build_index(path, index_path)
+
+    monkeypatch.setattr(unihan, "build_index", counted_build_index)
+    index_path = update_index(database)
+    assert index_path == index_path_for(database)
+    assert len(builds) == 1
+    assert update_index(database) == index_path
+    assert len(builds) == 1
+
+    # Only the stat is updated if the content is the same
+    stat = database.stat()
+    os.utime(database, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    update_index(database)
+    assert len(builds) == 1
+    with closing(unihan._connect(index_path, read_only=True)) as conn:
+        meta = dict(conn.execute("SELECT key, value FROM meta"))
+        assert meta["stat"] == unihan._database_stat(database)
+
+    # Otherwise the index is built again
+    with ZipFile(database, "a") as zf:
+        zf.writestr("Unihan_Variants.txt", "U+3400\tkSemanticVariant\tU+4E18\n")
+    with closing(open_index(database)) as conn:
+        assert len(builds) == 2
+        assert query_results(conn, [0x3400], ["kSemanticVariant"]) == [
+            (0x3400, "kSemanticVariant", "U+4E18")
+        ]
+
+
+def test_query_unihan_fallback(
+    database: Path,
+    monkeypatch: pytest.MonkeyPatch,
+    capsys: pytest.CaptureFixture[str],
+):
+    def open_index(path: Path, index_path: Optional[Path] = None):
+        raise error
+
+    monkeypatch.setattr(unihan, "open_index", open_index)
+    # Scans if the index can't be written or opened
+    error = sqlite3.OperationalError("unable to open database file")
+    query_unihan(database, [0x456B], ["kMandarin"])
+    out, err = capsys.readouterr()
+    assert out == "U+456B kMandarin = kuí\n"
+    assert "scanning instead" in err
+    # but doesn't hide bugs
+    error = sqlite3.IntegrityError("UNIQUE constraint failed")
+    with pytest.raises(sqlite3.IntegrityError):
+        query_unihan(database, [0x456B], ["kMandarin"])
+
+
+def test_unihan_db(database: Path):
+    with UnihanDB(database, cache_size=2) as db:
+        record = db[0x456B]
+        assert dict(record) == {"kDefinition": WALRUS, "kMandarin": "kuí"}
+        assert db["䕫"] is record
+        assert dict(db[0x3400]) == {
+            "kRSUnicode": "1.4",
+            "kTotalStrokes": "5",
+            "kDefinition": "(same as U+4E18 丘) hillock or mound",
+            "kMandarin": "qiū",
+        }
+        # records are read-only
+        with pytest.raises(TypeError):
+            record["kMandarin"] = "kui"  # type: ignore
+        for char in [0x3402, "A", "䕫䕫", 1.5]:
+            with pytest.raises(KeyError):
+                db[char]  # type: ignore
+            assert char not in db
+        assert "䕫" in db and 0x20000 in db
+
+        assert db.get("䕫", "kMandarin") == "kuí"
+        assert db.get("䕫", "kTotalStrokes") is None
+        assert db.get(0x3402, "kMandarin", "-") == "-"
+        assert db.get("䕫", "kCantonese", "-") == "-"
+
+        assert db.fields == ["kRSUnicode", "kTotalStrokes", "kDefinition", "kMandarin"]
+        with pytest.raises(KeyError):
+            db.field("kCantonese")
+
+
+def test_unihan_field(database: Path):
+    with UnihanDB(database) as db:
+        mandarin = db.field("kMandarin")
+        assert mandarin["䕫"] == mandarin[0x456B] == "kuí"
+        with pytest.raises(KeyError):
+            mandarin[0x3401]
+        assert 0x20000 in mandarin and 0x3401 not in mandarin
+        assert len(mandarin) == 3
+        # in scalar order
+        assert [*mandarin] == [0x3400, 0x456B, 0x20000]
+        assert [*mandarin.items()] == [
+            (0x3400, "qiū"),
+            (0x456B, "kuí"),
+            (0x20000, "hē"),
+        ]
+        assert dict(db.field("kDefinition").items()) == {
+            scalar: value
+            for scalar, field, value in PROPERTIES
+            if field == "kDefinition"
+        }
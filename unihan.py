@@ -1,8 +1,19 @@
 import argparse
+import bisect
+from contextlib import ExitStack
 from dataclasses import dataclass
+import functools
+import hashlib
+import itertools
+import json
+import operator
+import os
 from pathlib import Path
+import re
+import sqlite3
 import sys
-from typing import IO, Optional
+from types import MappingProxyType
+from typing import IO, ItemsView, Iterable, Iterator, Mapping, Optional, Union
 from zipfile import ZipFile, Path as ZPath
 
 
@@ -16,35 +27,212 @@ def parse_unihan_file(f: IO[str]):
         yield scalar, field, value
 
 
-def parse_unihan_zip(path: Path):
+@functools.lru_cache(maxsize=64)
+def _line_pattern(fields: Optional[tuple[str, ...]]) -> "re.Pattern[str]":
+    if fields is None:
+        field_pattern = r"[^\t\n]+"
+    else:
+        field_pattern = "|".join(map(re.escape, fields))
+    return re.compile(
+        r"^U\+([0-9A-Fa-f]+)\t(" + field_pattern + r")\t([^\r\n]*)", re.MULTILINE
+    )
+
+
+def _line_after(data: bytes, start: int, end: int, last: int) -> int:
+    # Start of the first line in data[start:end] with a scalar after last, or end.
+    # Lines are sorted by scalar, so it's found by bisecting the bytes.
+    def line_at(pos: int) -> int:
+        if pos == 0 and data.startswith(b"U+"):
+            return 0
+        found = data.find(b"\nU+", max(pos - 1, 0), end)
+        return end if found < 0 else found + 1
+
+    def is_after(pos: int) -> bool:
+        line = line_at(pos)
+        if line == end:
+            return True
+        return int(data[line + 2 : data.find(b"\t", line, end)], 16) > last
+
+    low, high = start, end
+    while low < high:
+        middle = (low + high) // 2
+        if is_after(middle):
+            high = middle
+        else:
+            low = middle + 1
+    return line_at(low)
+
+
+def parse_unihan_bytes(
+    data: bytes,
+    fields: Optional[Iterable[str]] = None,
+    first: Optional[int] = None,
+    last: Optional[int] = None,
+) -> "list[tuple[int, str, str]]":
+    """Like parse_unihan_file(), for the undecoded content of a file.
+
+    If fields is given, only the lines of those fields are parsed: the others are
+    skipped by the regular expression engine, and only the part of data between the
+    first and the last line of a field is decoded and searched, if any. If first or
+    last are given, the lines with a scalar before first or after last are not
+    decoded either (the lines of the Unihan files are sorted by scalar).
+    """
+    start, end = 0, len(data)
+    if fields is not None:
+        positions = {
+            field: (data.find(needle), data.rfind(needle))
+            for field in fields
+            for needle in [b"\t" + field.encode() + b"\t"]
+        }
+        positions = {field: pos for field, pos in positions.items() if pos[0] >= 0}
+        if not positions:
+            return []
+        first_found = min(first for first, _ in positions.values())
+        last_found = max(last for _, last in positions.values())
+        start = data.rfind(b"\n", 0, first_found) + 1
+        end = data.find(b"\n", last_found)
+        if end < 0:
+            end = len(data)
+        fields = tuple(sorted(positions))
+    if first is not None:
+        start = _line_after(data, start, end, first - 1)
+    if last is not None:
+        end = _line_after(data, start, end, last)
+    # Decoding all at once is much faster than decoding each value
+    text = data[start:end].decode("utf-8")
+    return [
+        (int(scalar, 16), field, value.rstrip())
+        for scalar, field, value in _line_pattern(fields).findall(text)
+    ]
+
+
+def _file_names(path: Path, is_dir: bool) -> list[str]:
+    if is_dir:
+        return [p.name for p in path.iterdir()]
     with ZipFile(path, "r") as zf:
-        root = ZPath(zf)
-        for p in root.iterdir():
-            with p.open() as f:
-                yield from parse_unihan_file(f)  # type: ignore
+        return [p.name for p in ZPath(zf).iterdir()]
+
+
+# Bytes read at once from a file when only its first scalars are needed
+_READ_SIZE = 1 << 16
+
+
+def _read_file(
+    path: Path, is_dir: bool, name: str, last: Optional[int] = None
+) -> bytes:
+    # If last is given, reading stops after a line with a scalar after it
+    with ExitStack() as stack:
+        if is_dir:
+            f = stack.enter_context(open(path / name, "rb"))
+        else:
+            zf = stack.enter_context(ZipFile(path, "r"))
+            f = stack.enter_context(zf.open(name))
+        if last is None:
+            return f.read()
+        chunks: list[bytes] = []
+        while chunk := f.read(_READ_SIZE):
+            chunks.append(chunk)
+            line = chunk.rfind(b"\nU+")
+            tab = chunk.find(b"\t", line) if line >= 0 else -1
+            if tab >= 0 and int(chunk[line + 3 : tab], 16) > last:
+                break
+        return b"".join(chunks)
+
+
+def _parse_file(path: Path, is_dir: bool, name: str, fields: Optional[list[str]]):
+    return parse_unihan_bytes(_read_file(path, is_dir, name), fields)
+
 
+def _parse_unihan(
+    path: Path, is_dir: bool, fields: Optional[list[str]], workers: Optional[int]
+):
+    names = _file_names(path, is_dir)
+    if workers is None:
+        for name in names:
+            yield from parse_unihan_bytes(_read_file(path, is_dir, name), fields)
+        return
 
-def parse_unihan_dir(path: Path):
-    for p in path.iterdir():
-        with p.open() as f:
-            yield from parse_unihan_file(f)
+    from concurrent.futures import ProcessPoolExecutor
 
+    with ProcessPoolExecutor(workers) as executor:
+        repeat = itertools.repeat
+        results = executor.map(
+            _parse_file, repeat(path), repeat(is_dir), names, repeat(fields)
+        )
+        # sorted() is stable (and faster than merging the files, which are each in
+        # scalar order): properties of the same scalar are still by file and then by
+        # field
+        yield from sorted(
+            itertools.chain.from_iterable(results), key=operator.itemgetter(0)
+        )
 
-def parse_unihan_db(path: Path):
+
+def parse_unihan_zip(
+    path: Path, fields: Optional[list[str]] = None, workers: Optional[int] = None
+):
+    """Properties in the Unihan_*.txt files in the zip file, one file after the other.
+
+    If fields is given, only the properties with those fields are parsed (see
+    parse_unihan_bytes()). With workers, files are parsed in that many processes, and
+    the properties of all the files are merged in scalar order.
+    """
+    return _parse_unihan(path, False, fields, workers)
+
+
+def parse_unihan_dir(
+    path: Path, fields: Optional[list[str]] = None, workers: Optional[int] = None
+):
+    """Like parse_unihan_zip(), for the extracted files in a directory."""
+    return _parse_unihan(path, True, fields, workers)
+
+
+def parse_unihan_db(
+    path: Path, fields: Optional[list[str]] = None, workers: Optional[int] = None
+):
     if path.is_dir():
-        return parse_unihan_dir(path)
+        return parse_unihan_dir(path, fields, workers)
     else:
-        return parse_unihan_zip(path)
+        return parse_unihan_zip(path, fields, workers)
 
 
-### Command line utility ###
+### Queries ###
+
+# Blocks of CJK ideographs (and radicals), which can be queried by name
+CJK_BLOCKS = {
+    "CJK Radicals Supplement": (0x2E80, 0x2EFF),
+    "Kangxi Radicals": (0x2F00, 0x2FDF),
+    "CJK Unified Ideographs Extension A": (0x3400, 0x4DBF),
+    "CJK Unified Ideographs": (0x4E00, 0x9FFF),
+    "CJK Compatibility Ideographs": (0xF900, 0xFAFF),
+    "CJK Unified Ideographs Extension B": (0x20000, 0x2A6DF),
+    "CJK Unified Ideographs Extension C": (0x2A700, 0x2B73F),
+    "CJK Unified Ideographs Extension D": (0x2B740, 0x2B81F),
+    "CJK Unified Ideographs Extension E": (0x2B820, 0x2CEAF),
+    "CJK Unified Ideographs Extension F": (0x2CEB0, 0x2EBEF),
+    "CJK Unified Ideographs Extension I": (0x2EBF0, 0x2EE5F),
+    "CJK Compatibility Ideographs Supplement": (0x2F800, 0x2FA1F),
+    "CJK Unified Ideographs Extension G": (0x30000, 0x3134F),
+    "CJK Unified Ideographs Extension H": (0x31350, 0x323AF),
+    "CJK Unified Ideographs Extension J": (0x323B0, 0x3347F),
+}
+
+
+def _block_key(name: str) -> str:
+    # Loose matching, as for Unicode property values: case, spaces, hyphens and
+    # underscores are ignored
+    return re.sub(r"[\s_-]", "", name).lower()
 
 
-def query_unihan(path, query_scalar=None, query_field=None):
-    for scalar, field, value in parse_unihan_db(path):
-        if query_field is None or field in query_field:
-            if query_scalar is None or scalar in query_scalar:
-                print(f"U+{scalar:X} {field} = {value}")
+_BLOCKS_BY_KEY = {_block_key(name): block for name, block in CJK_BLOCKS.items()}
+
+
+def block_range(name: str) -> Optional[tuple[int, int]]:
+    """First and last scalar of a block, by name ("Extension B" or "ExtB" for short)."""
+    key = _block_key(name)
+    short = re.fullmatch(r"ext(?:ension)?([a-z])", key)
+    if short:
+        key = f"cjkunifiedideographsextension{short[1]}"
+    return _BLOCKS_BY_KEY.get(key)
 
 
 def get_scalar(c: str):
@@ -65,6 +253,554 @@ def get_scalar(c: str):
             return ord(c)
 
 
+def parse_scalar_query(query: str) -> tuple[int, int]:
+    """First and last scalar for a query like U+3400..U+4DBF, a block name, or a
+    single code point (as for get_scalar())."""
+    first_s, dots, last_s = query.partition("..")
+    if dots and first_s and last_s:
+        first, last = get_scalar(first_s.strip()), get_scalar(last_s.strip())
+        if first is not None and last is not None and first <= last:
+            return first, last
+    else:
+        block = block_range(query)
+        if block is not None:
+            return block
+        scalar = get_scalar(query)
+        if scalar is not None:
+            return scalar, scalar
+    raise ValueError(f"not a code point, range or block: {query!r}")
+
+
+def read_scalar_queries(path: Path) -> list[str]:
+    """Queries in a file, one per line; empty lines and # comments are ignored."""
+    with open(path, encoding="utf-8") as f:
+        lines = (line.partition("#")[0].strip() for line in f)
+        return [line for line in lines if line]
+
+
+class ScalarSet:
+    """Set of scalars, stored as sorted and disjoint ranges (first, last)."""
+
+    def __init__(self, ranges: Iterable[tuple[int, int]] = ()):
+        self.ranges: list[tuple[int, int]] = []
+        for first, last in sorted(ranges):
+            if self.ranges and first <= self.ranges[-1][1] + 1:
+                previous_first, previous_last = self.ranges[-1]
+                self.ranges[-1] = (previous_first, max(previous_last, last))
+            else:
+                self.ranges.append((first, last))
+        self._firsts = [first for first, _ in self.ranges]
+
+    @classmethod
+    def from_scalars(cls, scalars: Iterable[int]) -> "ScalarSet":
+        return cls((scalar, scalar) for scalar in scalars)
+
+    @classmethod
+    def from_queries(cls, queries: Iterable[str]) -> "ScalarSet":
+        return cls(map(parse_scalar_query, queries))
+
+    def __contains__(self, scalar: object) -> bool:
+        if not isinstance(scalar, int):
+            return False
+        i = bisect.bisect_right(self._firsts, scalar) - 1
+        return i >= 0 and scalar <= self.ranges[i][1]
+
+    def __bool__(self) -> bool:
+        return bool(self.ranges)
+
+    @property
+    def first(self) -> Optional[int]:
+        return self.ranges[0][0] if self.ranges else None
+
+    @property
+    def last(self) -> Optional[int]:
+        return self.ranges[-1][1] if self.ranges else None
+
+
+def value_words(value: str) -> list[str]:
+    """Words in a value, as indexed for word queries (in lowercase)."""
+    return re.findall(r"\w+", value.lower())
+
+
+@functools.lru_cache(maxsize=64)
+def _compile(pattern: str) -> "re.Pattern[str]":
+    return re.compile(pattern)
+
+
+VALUE_QUERY_KINDS = ("exact", "prefix", "regex", "word")
+
+
+@dataclass(frozen=True)
+class ValueQuery:
+    """Query on the values of properties.
+
+    - exact: the value is pattern;
+    - prefix: the value starts with pattern;
+    - regex: the regular expression pattern is found in the value (re.search());
+    - word: every word of pattern is a word of the value, in any case (like "walrus"
+      in "a one-legged monster; a walrus").
+    """
+
+    kind: str
+    pattern: str
+
+    def __post_init__(self):
+        if self.kind not in VALUE_QUERY_KINDS:
+            raise ValueError(f"unknown kind of value query: {self.kind!r}")
+        if self.kind == "regex":
+            _compile(self.pattern)
+        elif self.kind == "word" and not value_words(self.pattern):
+            raise ValueError(f"no words to search for in {self.pattern!r}")
+
+    def matches(self, value: str) -> bool:
+        if self.kind == "exact":
+            return value == self.pattern
+        elif self.kind == "prefix":
+            return value.startswith(self.pattern)
+        elif self.kind == "regex":
+            return _compile(self.pattern).search(value) is not None
+        else:
+            # Most values don't even contain the words
+            lowered = value.lower()
+            if not all(word in lowered for word in self.words):
+                return False
+            return self.words <= set(value_words(lowered))
+
+    @functools.cached_property
+    def words(self) -> frozenset[str]:
+        return frozenset(value_words(self.pattern))
+
+
+### Index ###
+
+# The database is converted once into an SQLite file next to it (Unihan.zip.sqlite for
+# Unihan.zip), which is built again when the database changes.
+INDEX_SUFFIX = ".sqlite"
+INDEX_VERSION = 3
+
+# Fields are in the same order as in the database: by file (member), then by scalar
+# and name, as in each file.
+_SCHEMA = """
+CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT NOT NULL) WITHOUT ROWID;
+CREATE TABLE fields (
+    field TEXT PRIMARY KEY, member INTEGER NOT NULL, file TEXT NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE properties (
+    scalar INTEGER NOT NULL,
+    field TEXT NOT NULL,
+    value TEXT NOT NULL,
+    PRIMARY KEY (scalar, field)
+) WITHOUT ROWID;
+CREATE TABLE words (
+    word TEXT NOT NULL,
+    field TEXT NOT NULL,
+    scalar INTEGER NOT NULL,
+    PRIMARY KEY (word, field, scalar)
+) WITHOUT ROWID;
+CREATE TEMP TABLE new_words (word TEXT, field TEXT, scalar INTEGER);
+"""
+# Created after the tables are filled, which is faster than keeping them up to date.
+# words is the inverted index for word queries, filled in order, and
+# properties_by_value the one for exact and prefix queries (and for fields, since it
+# also has the scalars).
+_INDEXES = """
+INSERT INTO words SELECT * FROM new_words ORDER BY word, field, scalar;
+DROP TABLE new_words;
+CREATE INDEX properties_by_value ON properties (field, value);
+ANALYZE;
+"""
+
+# Bytes of the index mapped in memory by SQLite, instead of read into its page cache
+_MMAP_SIZE = 1 << 30
+
+
+def index_path_for(path: Path) -> Path:
+    return path.with_name(path.name + INDEX_SUFFIX)
+
+
+def _database_files(path: Path) -> list[Path]:
+    return sorted(path.iterdir()) if path.is_dir() else [path]
+
+
+def _database_stat(path: Path) -> str:
+    # Cheap to check every time: size and modification time of the files
+    stats = [(p.stat(), p.name) for p in _database_files(path)]
+    return " ".join(f"{name}:{st.st_size}:{st.st_mtime_ns}" for st, name in stats)
+
+
+def _database_hash(path: Path) -> str:
+    # Only computed when the stat changes, so that a database which is touched or
+    # copied (with the same content) doesn't need a new index
+    digest = hashlib.sha256()
+    for p in _database_files(path):
+        digest.update(p.name.encode() + b"\0")
+        with open(p, "rb") as f:
+            while chunk := f.read(1 << 20):
+                digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _connect(index_path: Path, read_only: bool = False) -> sqlite3.Connection:
+    if read_only:
+        conn = sqlite3.connect(f"{index_path.absolute().as_uri()}?mode=ro", uri=True)
+    else:
+        conn = sqlite3.connect(index_path)
+    conn.execute(f"PRAGMA mmap_size = {_MMAP_SIZE}")
+    return conn
+
+
+# Properties inserted at once while building the index
+_BATCH_SIZE = 100_000
+
+
+def _word_rows(properties: list[tuple[int, str, str]]):
+    for scalar, field, value in properties:
+        for word in set(value_words(value)):
+            yield word, field, scalar
+
+
+def build_index(path: Path, index_path: Optional[Path] = None) -> Path:
+    """Convert the database in path into an index (replacing it atomically)."""
+    if index_path is None:
+        index_path = index_path_for(path)
+    meta = {
+        "version": str(INDEX_VERSION),
+        "stat": _database_stat(path),
+        "hash": _database_hash(path),
+    }
+    temp_path = index_path.with_name(f"{index_path.name}.{os.getpid()}.tmp")
+    temp_path.unlink(missing_ok=True)
+    try:
+        conn = sqlite3.connect(temp_path)
+        try:
+            conn.execute("PRAGMA journal_mode = OFF")
+            conn.execute("PRAGMA synchronous = OFF")
+            conn.executescript(_SCHEMA)
+            is_dir = path.is_dir()
+            for member, name in enumerate(_file_names(path, is_dir)):
+                fields: dict[str, None] = {}
+                properties = parse_unihan_bytes(_read_file(path, is_dir, name))
+                for i in range(0, len(properties), _BATCH_SIZE):
+                    batch = properties[i : i + _BATCH_SIZE]
+                    conn.executemany("INSERT INTO properties VALUES (?, ?, ?)", batch)
+                    conn.executemany(
+                        "INSERT INTO new_words VALUES (?, ?, ?)", _word_rows(batch)
+                    )
+                    fields.update(dict.fromkeys(field for _, field, _ in batch))
+                conn.executemany(
+                    "INSERT OR IGNORE INTO fields VALUES (?, ?, ?)",
+                    ((field, member, name) for field in fields),
+                )
+            conn.executescript(_INDEXES)
+            conn.executemany("INSERT INTO meta VALUES (?, ?)", meta.items())
+            conn.commit()
+        finally:
+            conn.close()
+        os.replace(temp_path, index_path)
+    except BaseException:
+        temp_path.unlink(missing_ok=True)
+        raise
+    return index_path
+
+
+def update_index(path: Path, index_path: Optional[Path] = None) -> Path:
+    """Build the index of the database in path, unless it's up to date."""
+    if index_path is None:
+        index_path = index_path_for(path)
+    stat = _database_stat(path)
+    if index_path.exists():
+        conn = _connect(index_path)
+        try:
+            with conn:
+                meta = dict(conn.execute("SELECT key, value FROM meta"))
+                if meta.get("version") == str(INDEX_VERSION):
+                    if meta.get("stat") == stat:
+                        return index_path
+                    if meta.get("hash") == _database_hash(path):
+                        conn.execute(
+                            "UPDATE meta SET value = ? WHERE key = 'stat'", (stat,)
+                        )
+                        return index_path
+        except sqlite3.Error:
+            pass
+        finally:
+            conn.close()
+    return build_index(path, index_path)
+
+
+def open_index(path: Path, index_path: Optional[Path] = None) -> sqlite3.Connection:
+    """Open the index of the database in path (read-only), updating it if needed."""
+    return _connect(update_index(path, index_path), read_only=True)
+
+
+def _as_scalar_set(
+    query_scalar: "ScalarSet | Iterable[int] | None",
+) -> Optional[ScalarSet]:
+    if query_scalar is None or isinstance(query_scalar, ScalarSet):
+        return query_scalar
+    return ScalarSet.from_scalars(query_scalar)
+
+
+def _regexp(pattern: str, value: str) -> bool:
+    return _compile(pattern).search(value) is not None
+
+
+def query_index(
+    conn: sqlite3.Connection,
+    query_scalar: "ScalarSet | Iterable[int] | None" = None,
+    query_field: Optional[list[str]] = None,
+    query_value: Optional[ValueQuery] = None,
+) -> Iterator[tuple[int, str, str]]:
+    """Properties with the given scalars and fields, and values matching query_value,
+    in the order of the database."""
+    query_scalar = _as_scalar_set(query_scalar)
+    source = "properties p"
+    conditions: list[str] = []
+    params: list[object] = []
+    # Scalars are only checked while reading the results for word queries
+    check_scalar = False
+    if query_value is not None and query_value.kind == "word":
+        # Properties are found by their first word in the inverted index, and each of
+        # the other words is looked up there too.
+        first, *others = dict.fromkeys(value_words(query_value.pattern))
+        source = (
+            "words w CROSS JOIN properties p"
+            " ON p.scalar = w.scalar AND p.field = w.field"
+        )
+        conditions.append("w.word = ?")
+        params.append(first)
+        for word in others:
+            conditions.append(
+                "EXISTS (SELECT 1 FROM words o"
+                " WHERE o.word = ? AND o.field = p.field AND o.scalar = p.scalar)"
+            )
+            params.append(word)
+        check_scalar = query_scalar is not None
+    elif query_scalar is not None:
+        # The ranges are passed as JSON, and CROSS JOIN makes SQLite look up each of
+        # them in the primary key, instead of checking every property against the
+        # ranges.
+        source = (
+            "json_each(?) r CROSS JOIN properties p ON p.scalar"
+            " BETWEEN json_extract(r.value, '$[0]') AND json_extract(r.value, '$[1]')"
+        )
+        params.append(json.dumps(query_scalar.ranges))
+    if query_field is not None:
+        conditions.append(f"p.field IN ({', '.join('?' * len(query_field))})")
+        params.extend(query_field)
+    if query_value is not None:
+        pattern = query_value.pattern
+        if query_value.kind == "exact":
+            conditions.append("p.value = ?")
+            params.append(pattern)
+        elif query_value.kind == "prefix" and pattern:
+            # The range is what makes SQLite use properties_by_value
+            conditions.append("p.value >= ? AND substr(p.value, 1, ?) = ?")
+            params.extend([pattern, len(pattern), pattern])
+            # (there is no upper bound if the next character can't be encoded)
+            following = ord(pattern[-1]) + 1
+            if following <= sys.maxunicode and not 0xD800 <= following <= 0xDFFF:
+                conditions.append("p.value < ?")
+                params.append(pattern[:-1] + chr(following))
+        elif query_value.kind == "regex":
+            conn.create_function("regexp", 2, _regexp, deterministic=True)
+            conditions.append("regexp(?, p.value)")
+            params.append(pattern)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    rows = conn.execute(
+        "SELECT p.scalar, p.field, p.value "
+        f"FROM {source} JOIN fields f USING (field) {where} "
+        "ORDER BY f.member, p.scalar, p.field",
+        params,
+    )
+    if check_scalar:
+        assert query_scalar is not None
+        rows = (row for row in rows if row[0] in query_scalar)
+    yield from rows
+
+
+### Python API ###
+
+
+def _scalar(char: Union[int, str]) -> int:
+    if isinstance(char, str) and len(char) == 1:
+        return ord(char)
+    if isinstance(char, int):
+        return char
+    raise KeyError(char)
+
+
+class UnihanField(Mapping[int, str]):
+    """Value of a field for each scalar that has it, read from the index."""
+
+    def __init__(self, conn: sqlite3.Connection, field: str):
+        self._conn = conn
+        self.field = field
+
+    def __getitem__(self, char: Union[int, str]) -> str:
+        row = self._conn.execute(
+            "SELECT value FROM properties WHERE scalar = ? AND field = ?",
+            (_scalar(char), self.field),
+        ).fetchone()
+        if row is None:
+            raise KeyError(char)
+        return row[0]
+
+    def __iter__(self) -> Iterator[int]:
+        rows = self._conn.execute(
+            "SELECT scalar FROM properties WHERE field = ? ORDER BY scalar",
+            (self.field,),
+        )
+        return (scalar for scalar, in rows)
+
+    def __len__(self) -> int:
+        query = "SELECT COUNT(*) FROM properties WHERE field = ?"
+        return self._conn.execute(query, (self.field,)).fetchone()[0]
+
+    def items(self) -> ItemsView[int, str]:
+        return _UnihanFieldItems(self)
+
+
+class _UnihanFieldItems(ItemsView[int, str]):
+    _mapping: UnihanField
+
+    def __iter__(self) -> Iterator[tuple[int, str]]:
+        # One query, rather than one for each key
+        return iter(
+            self._mapping._conn.execute(
+                "SELECT scalar, value FROM properties WHERE field = ? ORDER BY scalar",
+                (self._mapping.field,),
+            )
+        )
+
+
+class UnihanDB:
+    """Properties of each character, read from the index of the database.
+
+    db[0x456B] (or db["䕫"]) is a read-only mapping from field to value, like
+    {"kCangjie": "TCHE", ...}, and db.field("kDefinition") a mapping from scalar to
+    value. Opening only checks that the index is up to date (building it the first
+    time); the index is memory-mapped, and the last cache_size records are cached.
+    """
+
+    def __init__(
+        self,
+        path: Path = Path("Unihan.zip"),
+        index_path: Optional[Path] = None,
+        cache_size: Optional[int] = 4096,
+    ):
+        self._conn = open_index(Path(path), index_path)
+        self._record = functools.lru_cache(maxsize=cache_size)(self._load_record)
+
+    def _load_record(self, scalar: int) -> Optional[Mapping[str, str]]:
+        rows = self._conn.execute(
+            "SELECT p.field, p.value FROM properties p JOIN fields f USING (field) "
+            "WHERE p.scalar = ? ORDER BY f.member, p.field",
+            (scalar,),
+        )
+        record = dict(rows)
+        return MappingProxyType(record) if record else None
+
+    def __getitem__(self, char: Union[int, str]) -> Mapping[str, str]:
+        record = self._record(_scalar(char))
+        if record is None:
+            raise KeyError(char)
+        return record
+
+    def __contains__(self, char: object) -> bool:
+        try:
+            self[char]  # type: ignore
+        except KeyError:
+            return False
+        return True
+
+    def get(
+        self, char: Union[int, str], field: str, default: Optional[str] = None
+    ) -> Optional[str]:
+        """Value of field for char, or default."""
+        try:
+            record = self[char]
+        except KeyError:
+            return default
+        return record.get(field, default)
+
+    def field(self, field: str) -> UnihanField:
+        if field not in self.fields:
+            raise KeyError(field)
+        return UnihanField(self._conn, field)
+
+    @functools.cached_property
+    def fields(self) -> list[str]:
+        """Names of the fields, in the order of the database."""
+        rows = self._conn.execute("SELECT field FROM fields ORDER BY member, field")
+        return [field for field, in rows]
+
+    def close(self):
+        self._record.cache_clear()
+        self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info: object):
+        self.close()
+
+
+### Command line utility ###
+
+
+def scan_unihan(
+    path, query_scalar=None, query_field=None, query_value=None, workers=None
+):
+    """Matching properties, from the whole database (in scalar order with workers)."""
+    query_scalar = _as_scalar_set(query_scalar)
+    if workers is None:
+        is_dir = path.is_dir()
+        # Nothing outside of the scalars of the query is parsed, or even read after
+        # the last one
+        first = query_scalar.first if query_scalar is not None else None
+        last = query_scalar.last if query_scalar is not None else None
+        properties = (
+            property
+            for name in _file_names(path, is_dir)
+            for property in parse_unihan_bytes(
+                _read_file(path, is_dir, name, last), query_field, first, last
+            )
+        )
+    else:
+        properties = parse_unihan_db(path, query_field, workers)
+    for scalar, field, value in properties:
+        if query_scalar is None or scalar in query_scalar:
+            if query_value is None or query_value.matches(value):
+                yield scalar, field, value
+
+
+def query_unihan(
+    path,
+    query_scalar=None,
+    query_field=None,
+    index_path=None,
+    query_value=None,
+    workers=None,
+):
+    """Print the matching properties, from the index unless index_path is False."""
+    query = (query_scalar, query_field, query_value)
+    if index_path is False:
+        results = scan_unihan(path, *query, workers)
+    else:
+        try:
+            conn = open_index(path, index_path)
+        except (OSError, sqlite3.OperationalError) as err:
+            # e.g. if the directory of the database is not writable. Other errors
+            # would be bugs, which a scan would only hide.
+            print(f"Can't use the index ({err}), scanning instead", file=sys.stderr)
+            results = scan_unihan(path, *query)
+        else:
+            results = query_index(conn, *query)
+    for scalar, field, value in results:
+        print(f"U+{scalar:X} {field} = {value}")
+
+
 def download_database(target_path: Path):
     from urllib.request import urlretrieve
 
@@ -79,7 +815,15 @@ class UnihanCLIArguments:
     db: str
     download_database: bool
     char: Optional[list[str]]
+    char_file: Optional[list[str]]
     field: Optional[list[str]]
+    index: Optional[str]
+    no_index: bool
+    workers: Optional[int]
+    exact: Optional[str]
+    prefix: Optional[str]
+    regex: Optional[str]
+    word: Optional[str]
 
 
 if __name__ == "__main__":
@@ -106,6 +850,23 @@ The database must be available either as a zip file, or extracted in a directory
         help="attempts to download the latest version of the database to the given path"
         " if it doesn't exist",
     )
+    parser.add_argument(
+        "--index",
+        help="path to the index of the database, built on first use and whenever the"
+        " database changes (default: the path of the database + .sqlite)",
+    )
+    parser.add_argument(
+        "--no-index",
+        action="store_true",
+        help="scan the whole database instead of using the index",
+    )
+    parser.add_argument(
+        "-j",
+        "--workers",
+        type=int,
+        help="with --no-index, parse the files of the database in this many processes"
+        " (then the results are sorted by code point)",
+    )
     query_options = parser.add_argument_group(
         "query options",
         "Add query options to filter the results. By default, no filtering is applied.",
@@ -115,7 +876,14 @@ The database must be available either as a zip file, or extracted in a directory
         "--char",
         nargs="+",
         help="search for properties for the given Unicode codepoint(s) "
-        "identified by numeric value or text (default: no filter)",
+        "identified by numeric value or text, ranges like U+3400..U+4DBF, or block "
+        "names like 'CJK Unified Ideographs' or ExtB (default: no filter)",
+    )
+    query_options.add_argument(
+        "--char-file",
+        action="append",
+        help="like --char, with one codepoint, range or block per line in a file "
+        "(# starts a comment)",
     )
     query_options.add_argument(
         "-f",
@@ -124,16 +892,57 @@ The database must be available either as a zip file, or extracted in a directory
         help="search for properties with the given field name(s) "
         "(default: no filter)",
     )
+    value_options = parser.add_argument_group(
+        "value options",
+        "Only print the properties with values matching one of these (best combined "
+        "with --field).",
+    ).add_mutually_exclusive_group()
+    value_options.add_argument(
+        "--exact", metavar="VALUE", help="search for properties with this value"
+    )
+    value_options.add_argument(
+        "--prefix", help="search for properties with values starting with PREFIX"
+    )
+    value_options.add_argument(
+        "--regex",
+        help="search for properties with values matching the regular expression REGEX",
+    )
+    value_options.add_argument(
+        "--word",
+        metavar="WORDS",
+        help="search for properties with values including all these words (ignoring "
+        "case)",
+    )
     args = parser.parse_args(namespace=UnihanCLIArguments)
     path = Path(args.db)
-    if args.char:
-        query_scalar = [*map(get_scalar, args.char)]
+    if args.char or args.char_file:
+        queries = [*(args.char or [])]
+        try:
+            for char_file in args.char_file or []:
+                queries.extend(read_scalar_queries(Path(char_file)))
+            query_scalar = ScalarSet.from_queries(queries)
+        except (OSError, ValueError) as err:
+            parser.error(str(err))
     else:
         query_scalar = None
+    query_value = None
+    for kind in VALUE_QUERY_KINDS:
+        pattern = getattr(args, kind)
+        if pattern is not None:
+            try:
+                query_value = ValueQuery(kind, pattern)
+            except (ValueError, re.error) as err:
+                parser.error(str(err))
     if not path.exists() and args.download_database:
         download_database(path)
+    if args.no_index:
+        index_path = False
+    else:
+        index_path = Path(args.index) if args.index else None
     try:
-        query_unihan(path, query_scalar, args.field)
+        query_unihan(
+            path, query_scalar, args.field, index_path, query_value, args.workers
+        )
     except FileNotFoundError as err:
         print(err, file=sys.stderr)
         sys.exit(1)